@@ -0,0 +1,141 @@
+# answer_cache.py - cache persistente (SQLite) de respostas para perguntas repetidas
+#
+# A tabela answer_cache é replicada pelo drive_utils (chave = `chave`, última
+# escrita vence por updated_at), então o cache sobrevive a reinícios do container
+# e é compartilhado entre réplicas. Exclusões deixam tombstone e não voltam pela
+# cópia de outra réplica. Os contadores (hits, last_hit) são de cada réplica.
+
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+
+from config_prompt import SYSTEM_PROMPT
+from database import connection, query, query_one, transaction
+
+CACHE_TTL_SECONDS = 30 * 24 * 3600   # respostas expiram em 30 dias
+CACHE_MAX_ENTRIES = 5000             # acima disso, remove as menos usadas recentemente
+
+# Muda sempre que o SYSTEM_PROMPT muda: respostas antigas deixam de valer
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:12]
+
+NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+NON_WORD = re.compile(r'[^\w#]+')
+
+# Contadores do processo (acertos/erros desde que o app subiu)
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def normalize(prompt):
+    """Forma canônica da pergunta e os números que ela contém.
+
+    'Como calcular ÁREA de laje 5,5 x 4?' -> ('como calcular area de laje # x #', ['5.5', '4'])
+    """
+    text = unicodedata.normalize('NFKD', prompt)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    numbers = [n.replace(',', '.') for n in NUMBER.findall(text)]
+    text = NUMBER.sub('#', text)
+    text = NON_WORD.sub(' ', text).strip()
+    return text, numbers
+
+
+def cache_key(prompt):
+    """Chave do cache: versão do prompt + modelo normalizado + valores numéricos.
+
+    Os números entram na chave porque a seção 4 traz um exemplo com eles;
+    perguntas que só mudam os valores compartilham o mesmo `modelo`.
+    """
+    template, numbers = normalize(prompt)
+    raw = f"{PROMPT_VERSION}|{template}|{','.join(numbers)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest(), template
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_cached_answer(prompt):
+    """Resposta em cache para a pergunta, ou None"""
+    key, _ = cache_key(prompt)
+    now = time.time()
+    row = query_one(
+        "SELECT resposta FROM answer_cache WHERE chave=? AND created_at >= ?",
+        (key, now - CACHE_TTL_SECONDS)
+    )
+    if row is None:
+        _count('misses')
+        return None
+    _count('hits')
+    # Contador local: sem transaction(), um acerto não agenda sync com o Drive
+    with connection() as conn:
+        conn.execute("UPDATE answer_cache SET hits = hits + 1, last_hit = ? WHERE chave=?", (now, key))
+    return row[0]
+
+
+def store_answer(prompt, answer):
+    key, template = cache_key(prompt)
+    now = time.time()
+    with transaction() as conn:
+        conn.execute(
+            """INSERT INTO answer_cache (chave, modelo, pergunta, resposta, created_at, last_hit, hits,
+                                        updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'))
+               ON CONFLICT (chave) DO UPDATE SET
+                   resposta = excluded.resposta, created_at = excluded.created_at,
+                   last_hit = excluded.last_hit, updated_at = excluded.updated_at""",
+            (key, template, prompt, answer, now, now)
+        )
+        _evict(conn, now)
+
+
+def _evict(conn, now):
+    conn.execute("DELETE FROM answer_cache WHERE created_at < ?", (now - CACHE_TTL_SECONDS,))
+    conn.execute(
+        """DELETE FROM answer_cache WHERE chave IN (
+               SELECT chave FROM answer_cache ORDER BY last_hit DESC LIMIT -1 OFFSET ?
+           )""",
+        (CACHE_MAX_ENTRIES,)
+    )
+
+
+# === ADMINISTRAÇÃO ===
+def cache_stats():
+    entries, total_hits, size = query_one(
+        "SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(LENGTH(resposta)), 0) FROM answer_cache"
+    )
+    with _stats_lock:
+        process = dict(_stats)
+    return {
+        'entries': entries,
+        'total_hits': total_hits,
+        'size_bytes': size,
+        'process_hits': process['hits'],
+        'process_misses': process['misses'],
+    }
+
+
+def list_entries(limit=200):
+    return query(
+        """SELECT chave, pergunta, hits, datetime(created_at, 'unixepoch', 'localtime'),
+                  datetime(last_hit, 'unixepoch', 'localtime')
+           FROM answer_cache ORDER BY hits DESC, last_hit DESC LIMIT ?""",
+        (limit,)
+    )
+
+
+def delete_entries(keys):
+    with transaction() as conn:
+        conn.executemany("DELETE FROM answer_cache WHERE chave=?", [(k,) for k in keys])
+
+
+def purge_expired():
+    with transaction() as conn:
+        conn.execute("DELETE FROM answer_cache WHERE created_at < ?", (time.time() - CACHE_TTL_SECONDS,))
+
+
+def purge_all():
+    with transaction() as conn:
+        conn.execute("DELETE FROM answer_cache")
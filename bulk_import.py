@@ -0,0 +1,101 @@
+# bulk_import.py - cadastro de turmas inteiras a partir de CSV/XLSX
+#
+# A planilha precisa das colunas "email" e "senha". O fluxo:
+#   1. validação dos e-mails de uma vez (pandas, sem laço em Python)
+#   2. duplicados na planilha e já cadastrados (uma consulta só ao banco)
+#   3. bcrypt em paralelo num pool de processos
+#   4. usuários e logs inseridos numa única transação (um único sync com o Drive)
+
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import bcrypt
+
+from database import EMAIL_PATTERN, query, transaction, registrar_logs
+
+EMAIL_COLUMNS = ("email", "e-mail")
+PASSWORD_COLUMNS = ("senha", "password")
+HASH_WORKERS = os.cpu_count() or 1
+HASH_CHUNK_SIZE = 8  # senhas por tarefa enviada ao pool
+BCRYPT_MAX_BYTES = 72  # o bcrypt recusa senhas maiores (ValueError no pool)
+
+
+def _hash_password(senha):
+    return bcrypt.hashpw(senha.encode(), bcrypt.gensalt())
+
+
+def read_table(uploaded_file):
+    """DataFrame (texto) de um CSV (separador , ou ;) ou XLSX enviado pelo st.file_uploader"""
+    import pandas as pd
+    if uploaded_file.name.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(uploaded_file, dtype=str)  # requer openpyxl
+    else:
+        df = pd.read_csv(uploaded_file, dtype=str, sep=None, engine="python", encoding="utf-8-sig")
+    df.columns = [str(col).strip().lower() for col in df.columns]
+    return df
+
+
+def _column(df, names):
+    for name in names:
+        if name in df.columns:
+            return df[name]
+    raise ValueError(f"A planilha precisa da coluna '{names[0]}'.")
+
+
+def prepare_import(df):
+    """Separa as linhas em (novos, rejeitados); rejeitados traz a coluna "motivo" """
+    import pandas as pd
+    linhas = pd.DataFrame({
+        "email": _column(df, EMAIL_COLUMNS).fillna("").str.strip(),
+        "senha": _column(df, PASSWORD_COLUMNS).fillna(""),
+    })
+    linhas = linhas[(linhas["email"] != "") | (linhas["senha"] != "")]  # linhas em branco
+
+    motivo = pd.Series(None, index=linhas.index, dtype=object)
+    motivo[linhas["senha"] == ""] = "Senha em branco"
+    motivo[linhas["senha"].str.encode("utf-8").str.len() > BCRYPT_MAX_BYTES] = \
+        f"Senha com mais de {BCRYPT_MAX_BYTES} bytes"
+    motivo[~linhas["email"].str.match(EMAIL_PATTERN.pattern)] = "E-mail inválido"
+    validos = motivo.isna()
+    motivo[validos & linhas["email"].where(validos).duplicated()] = "Repetido na planilha"
+
+    # Uma consulta para todos: json_each evita o limite de parâmetros do SQLite
+    candidatos = linhas.loc[motivo.isna(), "email"]
+    existentes = {row[0] for row in query(
+        "SELECT email FROM users WHERE email IN (SELECT value FROM json_each(?))",
+        (json.dumps(candidatos.tolist()),),
+    )}
+    motivo[motivo.isna() & linhas["email"].isin(existentes)] = "Já cadastrado"
+
+    rejeitados = linhas.loc[motivo.notna(), ["email"]].assign(motivo=motivo.dropna())
+    return linhas.loc[motivo.isna()], rejeitados
+
+
+def import_users(novos, progress=None):
+    """Cadastra as linhas de `novos` (email, senha); `progress(feitos, total)` acompanha o bcrypt"""
+    emails = novos["email"].tolist()
+    senhas = novos["senha"].tolist()
+    total = len(senhas)
+    if not total:
+        return 0
+
+    hashes = []
+    # spawn: um fork copiaria as threads e as conexões SQLite do Streamlit
+    with ProcessPoolExecutor(max_workers=min(HASH_WORKERS, total),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        for hashed in pool.map(_hash_password, senhas, chunksize=HASH_CHUNK_SIZE):
+            hashes.append(hashed)
+            if progress:
+                progress(len(hashes), total)
+
+    now = datetime.now()
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO users (email, senha, created_at, last_login) VALUES (?, ?, ?, ?)",
+            [(email, hashed, now, now) for email, hashed in zip(emails, hashes)],
+        )
+        registrar_logs(emails, "Cadastro")
+    return total
@@ -0,0 +1,554 @@
+# database.py - acesso ao auth.db compartilhado por main.py e painel_admin.py
+
+import atexit
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from drive_utils import DB_FILENAME, download_db_from_drive, enable_change_log, schedule_db_upload, set_schema_migrator
+
+DB_NAME = DB_FILENAME
+
+# Conexões reaproveitadas entre reruns do Streamlit (cada uma mantém seu
+# cache de statements preparados)
+POOL_SIZE = 8
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # leitores não bloqueiam o escritor
+    "PRAGMA synchronous=NORMAL",    # seguro em WAL, um fsync por checkpoint
+    "PRAGMA cache_size=-8000",      # ~8 MB de cache de páginas
+    "PRAGMA mmap_size=67108864",    # 64 MB mapeados em memória
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=30000",
+)
+
+# Gravação de logs em lote, em segundo plano
+LOG_QUEUE_SIZE = 10000       # eventos aguardando gravação
+LOG_BATCH_SIZE = 500         # linhas por transação
+LOG_BATCH_WINDOW = 0.5       # segundos acumulando eventos antes de gravar
+LOG_ENQUEUE_TIMEOUT = 0.2    # fila cheia: espera isso e então grava na própria thread
+LOG_WRITE_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_all_connections = []
+_pool_lock = threading.Lock()
+_local = threading.local()  # conexão emprestada à thread atual (permite aninhar)
+
+
+def _new_connection():
+    # isolation_level=None: transações só via transaction(), leituras em autocommit
+    conn = sqlite3.connect(
+        DB_NAME,
+        timeout=30,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    with _pool_lock:
+        _all_connections.append(conn)
+    return conn
+
+
+@contextmanager
+def connection():
+    """Empresta uma conexão do pool; chamadas aninhadas na mesma thread reutilizam a mesma"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        _local.depth += 1
+        try:
+            yield conn
+        finally:
+            _local.depth -= 1
+        return
+
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _new_connection()
+    _local.conn, _local.depth = conn, 1
+    try:
+        yield conn
+    finally:
+        _local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            _discard(conn)
+
+
+def _discard(conn):
+    with _pool_lock:
+        if conn in _all_connections:
+            _all_connections.remove(conn)
+    conn.close()
+
+
+@contextmanager
+def transaction():
+    """Transação de escrita (BEGIN IMMEDIATE ... COMMIT) que agenda o sync com o Drive.
+
+    Se já houver uma transação aberta na thread, participa dela. Transações que
+    não alteraram nenhuma linha (ex.: init_db sem migração pendente) não agendam sync.
+    """
+    with connection() as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+        changes = conn.total_changes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        changed = conn.total_changes != changes
+    if changed:
+        schedule_db_upload()
+
+
+def query(sql, params=()):
+    with connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def query_one(sql, params=()):
+    with connection() as conn:
+        return conn.execute(sql, params).fetchone()
+
+
+@atexit.register
+def close_all():
+    """Fecha as conexões do pool (faz o checkpoint do WAL no auth.db)"""
+    with _pool_lock:
+        connections = list(_all_connections)
+        _all_connections.clear()
+    while True:
+        try:
+            _pool.get_nowait()
+        except queue.Empty:
+            break
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+# === ESQUEMA (MIGRAÇÕES) ===
+# Recalcula do zero as tabelas de resumo a partir de logs/users
+ROLLUP_BACKFILL = (
+    "DELETE FROM logs_por_dia",
+    """INSERT INTO logs_por_dia (dia, acao_code, total)
+           SELECT COALESCE(date(timestamp), ''), COALESCE(acao_code, 0), COUNT(*)
+           FROM logs GROUP BY 1, 2""",
+    "INSERT OR REPLACE INTO contadores (nome, valor) VALUES ('users', (SELECT COUNT(*) FROM users))",
+)
+
+# MIGRATIONS[i] leva o banco da versão i para i + 1 (PRAGMA user_version).
+# Migração publicada não se edita: acrescente uma nova ao final da lista.
+MIGRATIONS = [
+    # 1: tabelas originais (bancos antigos já as têm, por isso IF NOT EXISTS)
+    [
+        '''CREATE TABLE IF NOT EXISTS users (
+               email TEXT PRIMARY KEY,
+               senha TEXT,
+               created_at TIMESTAMP,
+               last_login TIMESTAMP
+           )''',
+        '''CREATE TABLE IF NOT EXISTS logs (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               email TEXT,
+               acao TEXT,
+               timestamp TIMESTAMP
+           )''',
+    ],
+    # 2: ações normalizadas em códigos inteiros + índices do dashboard
+    [
+        "CREATE TABLE IF NOT EXISTS acoes (code INTEGER PRIMARY KEY, nome TEXT NOT NULL UNIQUE)",
+        """INSERT OR IGNORE INTO acoes (code, nome) VALUES
+               (1, 'Login Usuário'), (2, 'Login Admin'), (3, 'Cadastro'), (4, 'Remoção')""",
+        "INSERT OR IGNORE INTO acoes (nome) SELECT DISTINCT acao FROM logs WHERE acao IS NOT NULL",
+        "ALTER TABLE logs ADD COLUMN acao_code INTEGER REFERENCES acoes(code)",
+        "UPDATE logs SET acao_code = (SELECT code FROM acoes WHERE nome = logs.acao)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_acao_timestamp ON logs (acao_code, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_users_last_login ON users (last_login)",
+        "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at)",
+    ],
+    # 3: resumos mantidos por triggers (dashboard não varre logs)
+    [
+        """CREATE TABLE IF NOT EXISTS logs_por_dia (
+               dia TEXT NOT NULL,
+               acao_code INTEGER NOT NULL,
+               total INTEGER NOT NULL,
+               PRIMARY KEY (dia, acao_code)
+           ) WITHOUT ROWID""",
+        "CREATE TABLE IF NOT EXISTS contadores (nome TEXT PRIMARY KEY, valor INTEGER NOT NULL)",
+        """CREATE TRIGGER IF NOT EXISTS rollup_logs_ins AFTER INSERT ON logs BEGIN
+               INSERT INTO logs_por_dia (dia, acao_code, total)
+                   VALUES (COALESCE(date(NEW.timestamp), ''), COALESCE(NEW.acao_code, 0), 1)
+                   ON CONFLICT (dia, acao_code) DO UPDATE SET total = total + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS rollup_logs_del AFTER DELETE ON logs BEGIN
+               UPDATE logs_por_dia SET total = total - 1
+                   WHERE dia = COALESCE(date(OLD.timestamp), '') AND acao_code = COALESCE(OLD.acao_code, 0);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS rollup_logs_upd AFTER UPDATE OF timestamp, acao_code ON logs BEGIN
+               UPDATE logs_por_dia SET total = total - 1
+                   WHERE dia = COALESCE(date(OLD.timestamp), '') AND acao_code = COALESCE(OLD.acao_code, 0);
+               INSERT INTO logs_por_dia (dia, acao_code, total)
+                   VALUES (COALESCE(date(NEW.timestamp), ''), COALESCE(NEW.acao_code, 0), 1)
+                   ON CONFLICT (dia, acao_code) DO UPDATE SET total = total + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS rollup_users_ins AFTER INSERT ON users BEGIN
+               UPDATE contadores SET valor = valor + 1 WHERE nome = 'users';
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS rollup_users_del AFTER DELETE ON users BEGIN
+               UPDATE contadores SET valor = valor - 1 WHERE nome = 'users';
+           END""",
+        *ROLLUP_BACKFILL,
+    ],
+    # 4: paginação por chave (timestamp, id) e filtro por e-mail no log
+    [
+        "CREATE INDEX IF NOT EXISTS idx_logs_timestamp_id ON logs (timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_email_timestamp ON logs (email, timestamp)",
+    ],
+    # 5: cache de respostas do assistente (ver answer_cache.py)
+    [
+        """CREATE TABLE IF NOT EXISTS answer_cache (
+               chave TEXT PRIMARY KEY,
+               modelo TEXT NOT NULL,
+               pergunta TEXT NOT NULL,
+               resposta TEXT NOT NULL,
+               created_at REAL NOT NULL,
+               last_hit REAL NOT NULL,
+               hits INTEGER NOT NULL DEFAULT 0
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_answer_cache_last_hit ON answer_cache (last_hit)",
+    ],
+    # 6: tokens por pergunta enviada à OpenAI (mede o corte do histórico)
+    [
+        """CREATE TABLE IF NOT EXISTS uso_tokens (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               email TEXT,
+               timestamp DATETIME NOT NULL,
+               prompt_estimado INTEGER NOT NULL,
+               prompt_tokens INTEGER,
+               completion_tokens INTEGER,
+               mensagens_descartadas INTEGER NOT NULL DEFAULT 0
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_uso_tokens_timestamp ON uso_tokens (timestamp)",
+    ],
+    # 7: conferência local das fórmulas do item 3 (ver excel_formula.py)
+    [
+        """CREATE TABLE IF NOT EXISTS validacao_formulas (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               timestamp DATETIME NOT NULL,
+               resultado TEXT NOT NULL,
+               formula TEXT,
+               detalhe TEXT
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_validacao_formulas_timestamp ON validacao_formulas (timestamp)",
+    ],
+    # 8: sessões retomáveis sem bcrypt (ver session_tokens.py)
+    [
+        """CREATE TABLE IF NOT EXISTS sessions (
+               token_id TEXT PRIMARY KEY,
+               email TEXT NOT NULL,
+               created_at REAL NOT NULL,
+               expires_at REAL NOT NULL,
+               revoked INTEGER NOT NULL DEFAULT 0
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_email ON sessions (email)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)",
+        "CREATE TABLE IF NOT EXISTS app_config (chave TEXT PRIMARY KEY, valor TEXT NOT NULL)",
+        # Chave das assinaturas quando secrets.toml não traz [session] secret
+        "INSERT OR IGNORE INTO app_config (chave, valor) VALUES ('session_secret', lower(hex(randomblob(32))))",
+    ],
+    # 9: logs arquivados (ver log_archive.py) continuam contando nos resumos
+    [
+        "DROP TRIGGER IF EXISTS rollup_logs_del",
+        """CREATE TRIGGER rollup_logs_del AFTER DELETE ON logs
+               WHEN NOT EXISTS (SELECT 1 FROM app_config WHERE chave = 'arquivando_logs') BEGIN
+               UPDATE logs_por_dia SET total = total - 1
+                   WHERE dia = COALESCE(date(OLD.timestamp), '') AND acao_code = COALESCE(OLD.acao_code, 0);
+           END""",
+    ],
+    # 10: várias réplicas escrevendo (ver drive_utils): logs ganham um id de evento
+    # igual em todas as cópias e users a versão usada no "última escrita vence"
+    [
+        "ALTER TABLE logs ADD COLUMN evento TEXT",
+        "UPDATE logs SET evento = 'legado:' || id || ':' || COALESCE(timestamp, '') WHERE evento IS NULL",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_logs_evento ON logs (evento)",
+        "ALTER TABLE users ADD COLUMN updated_at TEXT",
+        "UPDATE users SET updated_at = COALESCE(last_login, created_at, '')",
+        """CREATE TRIGGER IF NOT EXISTS users_updated_at_ins AFTER INSERT ON users
+               WHEN NEW.updated_at IS NULL BEGIN
+               UPDATE users SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE rowid = NEW.rowid;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS users_updated_at_upd AFTER UPDATE ON users
+               WHEN NEW.updated_at IS OLD.updated_at BEGIN
+               UPDATE users SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE rowid = NEW.rowid;
+           END""",
+    ],
+    # 11: uso_tokens replicado entre réplicas (mesmo esquema de id de evento dos logs)
+    [
+        "ALTER TABLE uso_tokens ADD COLUMN evento TEXT",
+        "UPDATE uso_tokens SET evento = 'legado:' || id || ':' || COALESCE(timestamp, '') WHERE evento IS NULL",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_uso_tokens_evento ON uso_tokens (evento)",
+    ],
+    # 12: validacao_formulas replicado entre réplicas (id de evento, como em uso_tokens)
+    [
+        "ALTER TABLE validacao_formulas ADD COLUMN evento TEXT",
+        "UPDATE validacao_formulas SET evento = 'legado:' || id || ':' || COALESCE(timestamp, '') WHERE evento IS NULL",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_validacao_formulas_evento ON validacao_formulas (evento)",
+    ],
+    # 13: a chave das sessões vem só do secrets.toml (a gerada na migração 8 era
+    # diferente em cada réplica)
+    [
+        "DELETE FROM app_config WHERE chave = 'session_secret'",
+    ],
+    # 14: answer_cache com versão (última escrita vence), para que exclusões
+    # deixem tombstone e não voltem pela cópia de outra réplica
+    [
+        "ALTER TABLE answer_cache ADD COLUMN updated_at TEXT",
+        "UPDATE answer_cache SET updated_at = strftime('%Y-%m-%d %H:%M:%f', created_at, 'unixepoch')",
+    ],
+]
+
+
+def migrate(conn):
+    """Aplica, em ordem, as migrações que o banco ainda não tem"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return
+    # Cada réplica roda as mesmas migrações: os preenchimentos não vão para o Drive
+    replicated = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '_replication'").fetchone()
+    if replicated:
+        conn.execute("INSERT OR REPLACE INTO _replication (key, value) VALUES ('replaying', 1)")
+    for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        for sql in statements:
+            conn.execute(sql)
+        conn.execute(f"PRAGMA user_version = {target}")
+    if replicated:
+        conn.execute("DELETE FROM _replication WHERE key = 'replaying'")
+
+
+# O drive_utils migra o banco baixado antes de aplicar os segmentos
+set_schema_migrator(migrate)
+
+
+def init_db():
+    with transaction() as conn:
+        migrate(conn)
+    enable_change_log()
+
+
+def rebuild_rollups():
+    """Recalcula logs_por_dia e contadores a partir dos dados brutos.
+
+    Dias anteriores a 'logs_arquivados_ate' já saíram da tabela logs (estão nos
+    arquivos do Drive) e mantêm os totais que tinham.
+    """
+    flush_logs()
+    with transaction() as conn:
+        row = conn.execute("SELECT valor FROM app_config WHERE chave = 'logs_arquivados_ate'").fetchone()
+        if row is None:
+            for sql in ROLLUP_BACKFILL:
+                conn.execute(sql)
+            return
+        conn.execute("DELETE FROM logs_por_dia WHERE dia >= ?", (row[0],))
+        conn.execute("""INSERT INTO logs_por_dia (dia, acao_code, total)
+                            SELECT COALESCE(date(timestamp), ''), COALESCE(acao_code, 0), COUNT(*)
+                            FROM logs WHERE timestamp >= ? GROUP BY 1, 2""", (row[0],))
+        conn.execute(ROLLUP_BACKFILL[-1])
+
+
+def get_actions():
+    """Lista (código, nome) das ações conhecidas"""
+    return query("SELECT code, nome FROM acoes ORDER BY nome")
+
+
+def get_action_codes(pattern):
+    """Códigos das ações cujo nome contém `pattern` (ex.: 'Login')"""
+    return [row[0] for row in query("SELECT code FROM acoes WHERE nome LIKE ?", (f"%{pattern}%",))]
+
+
+# === USUÁRIOS E LOGS ===
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
+def is_valid_email(email):
+    return EMAIL_PATTERN.match(email) is not None
+
+
+def registrar_log(email, acao):
+    """Registra uma ação; a gravação é feita em lote por uma thread de fundo.
+
+    Dentro de uma transaction() aberta, o log entra na mesma transação.
+    """
+    event = (email, acao, datetime.now())
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        _insert_logs(conn, [event])
+        return
+    _ensure_log_writer()
+    try:
+        _log_queue.put(event, timeout=LOG_ENQUEUE_TIMEOUT)
+    except queue.Full:
+        # Backpressure: com a fila cheia quem chama paga a gravação
+        _write_logs([event])
+
+
+def registrar_logs(emails, acao):
+    """Registra a mesma ação para vários e-mails de uma vez (ex.: importação de turma)"""
+    now = datetime.now()
+    events = [(email, acao, now) for email in emails]
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        _insert_logs(conn, events)
+    else:
+        _write_logs(events)
+
+
+def user_exists(email):
+    return query_one("SELECT 1 FROM users WHERE email=?", (email,)) is not None
+
+
+def get_password_hash(email):
+    row = query_one("SELECT senha FROM users WHERE email=?", (email,))
+    return row[0] if row else None
+
+
+def update_last_login(email):
+    with transaction() as conn:
+        conn.execute("UPDATE users SET last_login=? WHERE email=?", (datetime.now(), email))
+
+
+def registrar_uso_tokens(email, prompt_estimado, prompt_tokens=None, completion_tokens=None,
+                         mensagens_descartadas=0):
+    """Guarda os tokens de uma chamada (prompt_tokens/completion_tokens vêm do `usage` da API)"""
+    with transaction() as conn:
+        conn.execute(
+            """INSERT INTO uso_tokens (email, timestamp, prompt_estimado, prompt_tokens,
+                                       completion_tokens, mensagens_descartadas, evento)
+               VALUES (?, ?, ?, ?, ?, ?, lower(hex(randomblob(16))))""",
+            (email, datetime.now(), prompt_estimado, prompt_tokens, completion_tokens,
+             mensagens_descartadas),
+        )
+
+
+def registrar_validacao(resultado, formula=None, detalhe=None):
+    """Guarda o resultado da conferência da fórmula (ok, corrigida, divergente, erro, nao_verificavel)"""
+    with transaction() as conn:
+        conn.execute(
+            """INSERT INTO validacao_formulas (timestamp, resultado, formula, detalhe, evento)
+               VALUES (?, ?, ?, ?, lower(hex(randomblob(16))))""",
+            (datetime.now(), resultado, formula, detalhe),
+        )
+
+
+def get_validation_stats(days=30):
+    """Quantidade de conferências por resultado nos últimos `days` dias"""
+    since = datetime.now() - timedelta(days=days)
+    return dict(query(
+        "SELECT resultado, COUNT(*) FROM validacao_formulas WHERE timestamp >= ? GROUP BY resultado",
+        (since,),
+    ))
+
+
+# === GRAVAÇÃO DE LOGS EM LOTE ===
+INSERT_LOG_SQL = """INSERT INTO logs (email, acao, acao_code, timestamp, evento)
+                    VALUES (?, ?, (SELECT code FROM acoes WHERE nome = ?), ?, lower(hex(randomblob(16))))"""
+
+_log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_log_wakeup = threading.Event()
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+
+def _ensure_log_writer():
+    global _log_writer
+    if _log_writer is not None and _log_writer.is_alive():
+        return
+    with _log_writer_lock:
+        if _log_writer is None or not _log_writer.is_alive():
+            _log_writer = threading.Thread(target=_log_worker, name="log-writer", daemon=True)
+            _log_writer.start()
+
+
+def _insert_logs(conn, events):
+    # Ações novas ganham um código antes de inserir os eventos
+    conn.executemany("INSERT OR IGNORE INTO acoes (nome) VALUES (?)",
+                     [(acao,) for acao in {acao for _, acao, _ in events}])
+    conn.executemany(INSERT_LOG_SQL, [(email, acao, acao, ts) for email, acao, ts in events])
+
+
+def _write_logs(events):
+    for attempt in range(1, LOG_WRITE_ATTEMPTS + 1):
+        try:
+            with transaction() as conn:
+                _insert_logs(conn, events)
+            return
+        except sqlite3.Error as e:
+            if attempt == LOG_WRITE_ATTEMPTS:
+                logger.error("Descartando %d logs após falha na gravação: %s", len(events), e)
+                return
+            time.sleep(attempt)
+
+
+def _log_worker():
+    while True:
+        batch = [_log_queue.get()]
+        # Janela curta para a rajada acumular (flush_logs() encerra a espera)
+        _log_wakeup.wait(LOG_BATCH_WINDOW)
+        _log_wakeup.clear()
+        while len(batch) < LOG_BATCH_SIZE:
+            try:
+                batch.append(_log_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _write_logs(batch)
+        finally:
+            for _ in batch:
+                _log_queue.task_done()
+
+
+def flush_logs():
+    """Aguarda a gravação de todos os logs enfileirados (ex.: antes de ler a tabela logs)"""
+    if _log_writer is None or not _log_writer.is_alive():
+        return
+    _log_wakeup.set()
+    _log_queue.join()
+
+
+# Roda antes de close_all() (atexit executa na ordem inversa do registro)
+atexit.register(flush_logs)
+
+
+# === LINHA DE COMANDO ===
+# python database.py rebuild-rollups  -> recalcula os resumos do dashboard
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["rebuild-rollups"]:
+        download_db_from_drive()
+        init_db()
+        rebuild_rollups()
+        print("Resumos recalculados.")
+    else:
+        print("Uso: python database.py rebuild-rollups")
@@ -1,20 +1,72 @@
 import io
 import os
+import gzip
+import json
+import base64
+import shutil
+import atexit
+import tempfile
+import logging
+import threading
+import time
+import uuid
 import streamlit as st
 import pickle
 import sqlite3
 
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+# Só o módulo de erros é importado aqui (é leve); discovery, http e oauth
+# carregam httplib2/requests e ficam para o primeiro uso do Drive
 from googleapiclient.errors import HttpError
 
+from storage import StorageBackend, LocalBackend, storage_config
+
 # === CONFIGURAÇÕES ===
 FOLDER_NAME = "banco-coeso"
 DB_FILENAME = "auth.db"
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 TOKEN_FILE = "token_drive.pkl"
+ID_CACHE_FILE = "drive_ids.json"  # IDs já resolvidos da pasta e dos arquivos
+
+# Sincronização em segundo plano: agrupa rajadas de escrita em um único upload
+SYNC_DEBOUNCE_SECONDS = 3.0    # aguarda este silêncio após a última escrita
+SYNC_MAX_DELAY_SECONDS = 20.0  # ... mas nunca atrasa mais que isso a primeira
+SYNC_RETRY_SECONDS = 5.0       # após uma falha; dobra a cada falha seguida
+SYNC_RETRY_MAX_SECONDS = 300   # ... até este teto
+
+# Após o primeiro download, só consulta o Drive de novo depois desta janela.
+# Pode ser sobrescrito em secrets.toml: [drive_sync] refresh_seconds = 600
+DB_REFRESH_SECONDS = 300.0
+
+# Campos do Drive que identificam uma versão do arquivo
+REMOTE_META_FIELDS = "id, md5Checksum, modifiedTime, version, headRevisionId"
+
+# Replicação incremental: tabelas replicadas -> coluna chave (igual em todas as réplicas)
+REPLICATED_TABLES = {'users': 'email', 'logs': 'evento', 'acoes': 'nome', 'sessions': 'token_id',
+                     'answer_cache': 'chave', 'uso_tokens': 'evento', 'validacao_formulas': 'evento'}
+SEGMENT_PREFIX = f"{DB_FILENAME}.seg-"  # auth.db.seg-000000000123-<réplica>.jsonl.gz
+COMPACT_EVERY_SEGMENTS = 50  # após N segmentos, envia um snapshot base novo
+
+# Conflitos entre réplicas (várias instâncias escrevendo ao mesmo tempo)
+# Numerados por cada réplica, não viajam
+LOCAL_ID_COLUMNS = {'logs': 'id', 'acoes': 'code', 'uso_tokens': 'id', 'validacao_formulas': 'id'}
+IMMUTABLE_TABLES = {'logs', 'acoes', 'uso_tokens', 'validacao_formulas'}  # eventos: a primeira cópia basta
+LWW_COLUMNS = {'users': 'updated_at', 'answer_cache': 'updated_at'}  # a escrita mais recente vence
+MONOTONIC_COLUMNS = {'sessions': {'revoked'}}       # revogação não se desfaz
+# Contadores de cada réplica: alterá-los não gera segmento nem sobrescreve os de outra
+COUNTER_COLUMNS = {'answer_cache': {'hits', 'last_hit'}}
+MERGE_CHUNK_ROWS = 5000
+UPLOAD_CONFLICT_ATTEMPTS = 3  # bases de outras réplicas mescladas antes de desistir do upload
+NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# Transferências: snapshot gzip enviado em partes (upload resumível)
+TRANSFER_CHUNK_SIZE = 5 * 1024 * 1024  # múltiplo de 256 KB, exigido pelo Drive
+TRANSFER_RETRIES = 5
+GZIP_MAGIC = b'\x1f\x8b'
+
+logger = logging.getLogger(__name__)
+
+# O cliente HTTP da API do Drive (httplib2) não é thread-safe: uma chamada por vez
+_drive_lock = threading.RLock()
 
 
 @st.cache_resource
@@ -33,6 +85,7 @@ def get_drive_service():
     # Se não houver token válido, inicia fluxo de autenticação
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
+            from google.auth.transport.requests import Request
             creds.refresh(Request())
         else:
             # Configurações do secrets.toml
@@ -46,6 +99,7 @@ def get_drive_service():
                 }
             }
 
+            from google_auth_oauthlib.flow import Flow
             flow = Flow.from_client_config(client_config, SCOPES)
             flow.redirect_uri = "urn:ietf:wg:oauth:2.0:oob"
 
@@ -67,23 +121,80 @@ def get_drive_service():
                 st.error(f"Erro ao autenticar com o Google: {e}")
                 st.stop()
 
-    return build("drive", "v3", credentials=creds)
+    from googleapiclient.discovery import build
+    # Documento de discovery embutido no pacote: sem ida à rede para montar o serviço
+    return build("drive", "v3", credentials=creds, static_discovery=True, cache_discovery=False)
+
+
+# === SERVIÇO (criado no primeiro uso, não na importação) ===
+_service = None
+
+
+def _drive():
+    global _service
+    if _service is None:
+        try:
+            _service = get_drive_service()
+        except Exception as e:
+            st.error(f"Erro na autenticação do Google Drive: {str(e)}")
+            raise
+    return _service
 
 
-# === INSTANCIA O SERVIÇO ===
-try:
-    service = get_drive_service()
-except Exception as e:
-    st.error(f"Erro na autenticação do Google Drive: {str(e)}")
-    raise
+# === CACHE DE IDs DO DRIVE ===
+# Nome -> ID, em memória e em disco, para evitar buscas files().list a cada sync
+_drive_ids = None
+
+
+def _load_ids():
+    global _drive_ids
+    if _drive_ids is None:
+        try:
+            with open(ID_CACHE_FILE) as f:
+                _drive_ids = json.load(f)
+        except (OSError, ValueError):
+            _drive_ids = {}
+    return _drive_ids
+
+
+def _save_ids():
+    tmp = ID_CACHE_FILE + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(_drive_ids, f)
+        os.replace(tmp, ID_CACHE_FILE)
+    except OSError as e:
+        # O cache em disco é opcional; o de memória continua valendo
+        logger.warning("Não foi possível gravar %s: %s", ID_CACHE_FILE, e)
+
+
+def _remember_id(name, file_id):
+    ids = _load_ids()
+    if ids.get(name) != file_id:
+        ids[name] = file_id
+        _save_ids()
+
+
+def _forget_ids(*names):
+    ids = _load_ids()
+    removed = [ids.pop(name, None) for name in names]
+    if any(removed):
+        _save_ids()
+
+
+def _is_not_found(error):
+    return isinstance(error, HttpError) and error.resp.status == 404
 
 
 # === FUNÇÕES DE UPLOAD E DOWNLOAD ===
 def get_folder_id():
     """Obtém ou cria a pasta 'banco-coeso' no Google Drive"""
+    folder_id = _load_ids().get(FOLDER_NAME)
+    if folder_id:
+        return folder_id
     try:
         # Primeiro tenta encontrar a pasta
-        results = service.files().list(
+        results = _drive().files().list(
             q=f"name='{FOLDER_NAME}' and mimeType='application/vnd.google-apps.folder' and trashed=false",
             spaces='drive',
             fields="files(id, name)",
@@ -92,17 +203,19 @@ def get_folder_id():
         folders = results.get('files', [])
         
         if folders:
-            return folders[0]['id']
+            folder_id = folders[0]['id']
         else:
             # Se não encontrar, cria a pasta
             file_metadata = {
                 'name': FOLDER_NAME,
                 'mimeType': 'application/vnd.google-apps.folder'
             }
-            folder = service.files().create(body=file_metadata, fields='id').execute()
+            folder = _drive().files().create(body=file_metadata, fields='id').execute()
             st.success(f"Pasta '{FOLDER_NAME}' criada com sucesso no Google Drive!")
-            return folder['id']
-            
+            folder_id = folder['id']
+        _remember_id(FOLDER_NAME, folder_id)
+        return folder_id
+
     except HttpError as error:
         st.error(f"Erro ao buscar/criar pasta: {error}")
         raise
@@ -111,37 +224,755 @@ def get_folder_id():
         raise
 
 
-def download_db_from_drive():
-    """Faz download do banco de dados do Google Drive ou cria um novo se não existir"""
+def _find_file(name):
+    """Retorna os metadados do arquivo `name` na pasta do app, ou None.
+
+    Usa o ID em cache (um único files().get); se o arquivo sumiu (404) ou foi
+    para a lixeira, descarta o cache e refaz a busca por nome.
+    """
+    file_id = _load_ids().get(name)
+    if file_id:
+        try:
+            meta = _drive().files().get(
+                fileId=file_id, fields=f"{REMOTE_META_FIELDS}, trashed"
+            ).execute()
+            if not meta.get('trashed'):
+                return meta
+        except HttpError as error:
+            if not _is_not_found(error):
+                raise
+        # Arquivo apagado ou na lixeira: a pasta pode ter ido junto
+        _forget_ids(name, FOLDER_NAME)
+
+    folder_id = get_folder_id()
+    results = _drive().files().list(
+        q=f"name='{name}' and '{folder_id}' in parents and trashed=false",
+        spaces='drive',
+        fields=f"files({REMOTE_META_FIELDS})",
+        pageSize=1
+    ).execute()
+    files = results.get('files', [])
+    if not files:
+        return None
+    _remember_id(name, files[0]['id'])
+    return files[0]
+
+
+def _put_file(name, make_media):
+    """Atualiza (ou cria) o arquivo `name` na pasta do app e devolve seus metadados.
+
+    `make_media` cria um novo corpo de upload a cada tentativa. No caminho comum
+    é uma única chamada update() com o ID em cache.
+    """
+    fields = f"{REMOTE_META_FIELDS}, trashed"
+    file_id = _load_ids().get(name)
+    if file_id:
+        try:
+            meta = _execute(_drive().files().update(
+                fileId=file_id, media_body=make_media(), fields=fields
+            ))
+            if not meta.get('trashed'):
+                return meta
+        except HttpError as error:
+            if not _is_not_found(error):
+                raise
+        _forget_ids(name, FOLDER_NAME)
+
+    existing = _find_file(name)
+    if existing:
+        meta = _execute(_drive().files().update(
+            fileId=existing['id'], media_body=make_media(), fields=fields
+        ))
+    else:
+        meta = _create_file(name, make_media, fields)
+    _remember_id(name, meta['id'])
+    return meta
+
+
+def _create_file(name, make_media, fields='id'):
+    """Cria um arquivo novo na pasta do app"""
+    body = {'name': name, 'parents': [get_folder_id()]}
     try:
-        # Primeiro garante que a pasta existe
-        folder_id = get_folder_id()
-        
-        # Depois procura o arquivo
-        results = service.files().list(
-            q=f"name='{DB_FILENAME}' and '{folder_id}' in parents and trashed=false",
+        return _execute(_drive().files().create(body=body, media_body=make_media(), fields=fields))
+    except HttpError as error:
+        if not _is_not_found(error):
+            raise
+        # A pasta em cache não existe mais
+        _forget_ids(FOLDER_NAME)
+        body['parents'] = [get_folder_id()]
+        return _execute(_drive().files().create(body=body, media_body=make_media(), fields=fields))
+
+
+def _is_transient(error):
+    if isinstance(error, HttpError):
+        return error.resp.status >= 500 or error.resp.status == 429
+    return isinstance(error, (OSError, TimeoutError))
+
+
+def _execute(request):
+    """Executa a requisição; uploads resumíveis retomam de onde pararam após falhas de rede"""
+    if getattr(request, 'resumable', None) is None:
+        return request.execute(num_retries=TRANSFER_RETRIES)
+    response = None
+    failures = 0
+    while response is None:
+        try:
+            _, response = request.next_chunk(num_retries=TRANSFER_RETRIES)
+        except Exception as error:
+            failures += 1
+            if failures > TRANSFER_RETRIES or not _is_transient(error):
+                raise
+            # O objeto da requisição guarda a URI de sessão e o offset já enviado
+            time.sleep(min(2 ** failures, 30))
+    return response
+
+
+def _download_to(fh, file_id):
+    from googleapiclient.http import MediaIoBaseDownload
+    downloader = MediaIoBaseDownload(
+        fh, _drive().files().get_media(fileId=file_id), chunksize=TRANSFER_CHUNK_SIZE
+    )
+    done = False
+    while not done:
+        _, done = downloader.next_chunk(num_retries=TRANSFER_RETRIES)
+
+
+def _list_files(prefix):
+    """(nome, id) dos arquivos da pasta do app cujo nome começa com `prefix`"""
+    folder_id = get_folder_id()
+    files = []
+    page_token = None
+    while True:
+        results = _drive().files().list(
+            q=f"name contains '{prefix}' and '{folder_id}' in parents and trashed=false",
             spaces='drive',
-            fields="files(id, name)",
-            pageSize=1
+            fields="nextPageToken, files(id, name)",
+            pageSize=1000,
+            pageToken=page_token
         ).execute()
-        files = results.get('files', [])
-        
-        if not files:
-            # Se não encontrar o arquivo, cria um banco de dados vazio local
-            conn = sqlite3.connect(DB_FILENAME)
+        files += [(f['name'], f['id']) for f in results.get('files', []) if f['name'].startswith(prefix)]
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    return files
+
+
+def _media(source):
+    from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+    if isinstance(source, (bytes, bytearray)):
+        return MediaIoBaseUpload(io.BytesIO(source), mimetype='application/gzip')
+    return MediaFileUpload(source, mimetype='application/gzip', chunksize=TRANSFER_CHUNK_SIZE, resumable=True)
+
+
+class DriveBackend(StorageBackend):
+    """Google Drive: pasta banco-coeso, IDs em cache e uploads resumíveis"""
+
+    def find(self, name):
+        return _find_file(name)
+
+    def list(self, prefix):
+        return _list_files(prefix)
+
+    def download(self, file_id, fh):
+        _download_to(fh, file_id)
+
+    def put(self, name, source):
+        return _put_file(name, lambda: _media(source))
+
+    def create(self, name, source):
+        return _create_file(name, lambda: _media(source), REMOTE_META_FIELDS)
+
+    def delete(self, file_id):
+        try:
+            _drive().files().delete(fileId=file_id).execute()
+        except HttpError as error:
+            if not _is_not_found(error):
+                raise
+
+
+# === BACKEND DE ARMAZENAMENTO (ver storage.py) ===
+_backend = None
+
+
+def storage_backend():
+    """Backend escolhido em [storage] do secrets.toml; Google Drive por padrão"""
+    global _backend
+    if _backend is None:
+        config = storage_config()
+        kind = config.get('backend', 'drive')
+        if kind == 'local':
+            _backend = LocalBackend.from_config(config)
+            logger.info("Armazenamento local em %s (sem Google Drive)", _backend.root)
+        elif kind == 'drive':
+            _backend = DriveBackend()
+        else:
+            raise ValueError(f"Backend de armazenamento desconhecido: {kind!r}")
+    return _backend
+
+
+def _download_bytes(file_id):
+    buffer = io.BytesIO()
+    storage_backend().download(file_id, buffer)
+    return buffer.getvalue()
+
+
+# === SNAPSHOTS ===
+def _check_integrity(path):
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != 'ok':
+        raise sqlite3.DatabaseError(f"Snapshot corrompido ({path}): {result}")
+
+
+def _backup(src_path, dst_path):
+    """Cópia consistente via API de backup do SQLite, mesmo com o banco em uso"""
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def _make_snapshot(workdir):
+    """Gera um snapshot consistente e comprimido do auth.db; devolve o caminho do .gz"""
+    raw_path = os.path.join(workdir, "snapshot.db")
+    gz_path = raw_path + ".gz"
+    _backup(DB_FILENAME, raw_path)
+    _check_integrity(raw_path)
+    with open(raw_path, 'rb') as src, gzip.open(gz_path, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, TRANSFER_CHUNK_SIZE)
+    return gz_path
+
+
+def _fetch_snapshot(file_id, workdir):
+    """Baixa o snapshot, descomprime e verifica; devolve o caminho do banco em `workdir`"""
+    download_path = os.path.join(workdir, "download")
+    raw_path = os.path.join(workdir, "snapshot.db")
+    with io.FileIO(download_path, 'wb') as fh:
+        storage_backend().download(file_id, fh)
+    with open(download_path, 'rb') as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    if compressed:
+        with gzip.open(download_path, 'rb') as src, open(raw_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, TRANSFER_CHUNK_SIZE)
+    else:
+        # Bases antigas foram enviadas sem compressão
+        os.replace(download_path, raw_path)
+    _check_integrity(raw_path)
+    return raw_path
+
+
+def _restore_snapshot(file_id):
+    """Substitui o auth.db local pelo snapshot do Drive"""
+    with tempfile.TemporaryDirectory() as workdir:
+        raw_path = _fetch_snapshot(file_id, workdir)
+        # A API de backup substitui o conteúdo sem trocar o arquivo sob conexões abertas
+        _backup(raw_path, DB_FILENAME)
+
+
+# === REPLICAÇÃO INCREMENTAL (CHANGE LOG) ===
+# Triggers registram em _changes quais linhas de users/logs mudaram. Cada sync
+# envia só essas linhas como um segmento gzip (auth.db.seg-<seq>-<réplica>.jsonl.gz);
+# a cada COMPACT_EVERY_SEGMENTS segmentos um snapshot base novo substitui o
+# auth.db no Drive e os segmentos já incorporados a ela são apagados.
+# Restaurar = base + replay dos segmentos que ela ainda não incorporou
+# (_applied_segments).
+#
+# Várias réplicas podem escrever ao mesmo tempo: cada processo assina seus
+# segmentos, as linhas são mescladas (UPSERT) pelas regras de conflito do topo
+# e uma base só sobrescreve a do Drive se esta não mudou desde a última
+# leitura; se mudou, a base remota é mesclada na local antes do upload.
+_segments_since_base = None  # segmentos no Drive desde o último snapshot base
+_replica_id = uuid.uuid4().hex[:8]  # assina os segmentos enviados por este processo
+
+
+def enable_change_log():
+    """Cria a tabela _changes e os triggers de replicação (idempotente)"""
+    conn = sqlite3.connect(DB_FILENAME)
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS _changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tbl TEXT NOT NULL,
+                    pk
+                )''')
+    c.execute("CREATE TABLE IF NOT EXISTS _replication (key TEXT PRIMARY KEY, value)")
+    # Segmentos do Drive (de qualquer réplica) já incorporados a este banco
+    c.execute("CREATE TABLE IF NOT EXISTS _applied_segments (name TEXT PRIMARY KEY)")
+    # Exclusões nas tabelas LWW: impedem que a cópia de outra réplica ressuscite a linha
+    c.execute('''CREATE TABLE IF NOT EXISTS _tombstones (
+                    tbl TEXT NOT NULL,
+                    pk NOT NULL,
+                    deleted_at TEXT NOT NULL,
+                    PRIMARY KEY (tbl, pk)
+                )''')
+    triggers = dict(c.execute("SELECT name, sql FROM sqlite_master WHERE type='trigger'"))
+    # Durante o replay a flag 'replaying' existe (só dentro da transação) e
+    # os triggers ficam mudos, para não reenviar o que veio do Drive
+    guard = "WHEN NOT EXISTS (SELECT 1 FROM _replication WHERE key='replaying')"
+    for table, key in REPLICATED_TABLES.items():
+        if key not in _table_columns(c, table):
+            # Tabela (ou coluna chave) de uma migração que este banco ainda não rodou
+            continue
+        old = triggers.get(f"_chg_{table}_ins")
+        if old is not None and f"NEW.{key})" not in old:
+            # A chave de replicação mudou (logs.id -> evento, acoes.code -> nome): recria
+            # os triggers e converte as alterações pendentes (a chave antiga era o rowid)
+            for op in ('ins', 'upd', 'del'):
+                c.execute(f"DROP TRIGGER IF EXISTS _chg_{table}_{op}")
+            c.execute(f"UPDATE _changes SET pk = (SELECT {key} FROM {table} WHERE rowid = _changes.pk) "
+                      f"WHERE tbl = ?", (table,))
+            c.execute("DELETE FROM _changes WHERE tbl = ? AND pk IS NULL", (table,))
+        # Só as colunas replicadas disparam o trigger de UPDATE (não os contadores)
+        watched = ''
+        if table in COUNTER_COLUMNS:
+            watched = " OF " + ", ".join(sorted(_table_columns(c, table) - COUNTER_COLUMNS[table]))
+        old = triggers.get(f"_chg_{table}_upd")
+        if old is not None and f"AFTER UPDATE{watched} ON {table} " not in old:
+            c.execute(f"DROP TRIGGER _chg_{table}_upd")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS _chg_{table}_ins AFTER INSERT ON {table} {guard}
+                      BEGIN INSERT INTO _changes (tbl, pk) VALUES ('{table}', NEW.{key}); END""")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS _chg_{table}_upd AFTER UPDATE{watched} ON {table} {guard}
+                      BEGIN
+                          INSERT INTO _changes (tbl, pk) VALUES ('{table}', NEW.{key});
+                          INSERT INTO _changes (tbl, pk) SELECT '{table}', OLD.{key} WHERE OLD.{key} IS NOT NEW.{key};
+                      END""")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS _chg_{table}_del AFTER DELETE ON {table} {guard}
+                      BEGIN INSERT INTO _changes (tbl, pk) VALUES ('{table}', OLD.{key}); END""")
+        if table in LWW_COLUMNS:
+            c.execute(f"""CREATE TRIGGER IF NOT EXISTS _tomb_{table} AFTER DELETE ON {table} {guard}
+                          BEGIN INSERT OR REPLACE INTO _tombstones (tbl, pk, deleted_at)
+                                VALUES ('{table}', OLD.{key}, {NOW_SQL}); END""")
+    conn.commit()
+    conn.close()
+
+
+def _table_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")}
+
+
+def _local_seq(conn):
+    row = conn.execute("SELECT value FROM _replication WHERE key='seq'").fetchone()
+    return row[0] if row else 0
+
+
+def _set_local_seq(conn, seq):
+    conn.execute("INSERT OR REPLACE INTO _replication (key, value) VALUES ('seq', ?)", (seq,))
+    # Novas alterações locais precisam receber seq maior que o já replicado
+    conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name='_changes'", (seq,))
+    conn.execute("""INSERT INTO sqlite_sequence (name, seq) SELECT '_changes', ?
+                    WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name='_changes')""", (seq,))
+
+
+def _encode_value(value):
+    if isinstance(value, bytes):
+        return {'$b': base64.b64encode(value).decode('ascii')}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return base64.b64decode(value['$b'])
+    return value
+
+
+def _build_segment(conn):
+    """Lê _changes e devolve (último seq, bytes gzip) ou (None, None) se vazio"""
+    changes = conn.execute("SELECT seq, tbl, pk FROM _changes ORDER BY seq").fetchall()
+    if not changes:
+        return None, None
+    lines = []
+    seen = set()
+    for _, table, pk in changes:
+        if (table, pk) in seen or table not in REPLICATED_TABLES:
+            continue
+        seen.add((table, pk))
+        cursor = conn.execute(f"SELECT * FROM {table} WHERE {REPLICATED_TABLES[table]}=?", (pk,))
+        row = cursor.fetchone()
+        entry = {'t': table, 'k': pk, 'r': None}  # r=None significa que a linha foi removida
+        if row is not None:
+            columns = [d[0] for d in cursor.description]
+            entry['r'] = {col: _encode_value(val) for col, val in zip(columns, row)
+                          if col != LOCAL_ID_COLUMNS.get(table)}
+        elif table in LWW_COLUMNS:
+            tomb = conn.execute("SELECT deleted_at FROM _tombstones WHERE tbl=? AND pk=?",
+                                (table, pk)).fetchone()
+            if tomb:
+                entry['d'] = tomb[0]
+        lines.append(json.dumps(entry, ensure_ascii=False))
+    return changes[-1][0], gzip.compress("\n".join(lines).encode('utf-8'))
+
+
+def _logs_archived_before(conn):
+    """Logs anteriores a esta data já foram para os arquivos do Drive (ver log_archive.py)"""
+    try:
+        row = conn.execute("SELECT valor FROM app_config WHERE chave = 'logs_arquivados_ate'").fetchone()
+    except sqlite3.OperationalError:
+        return ''
+    return row[0] if row else ''
+
+
+def _merge_rows(conn, table, columns, rows, local_columns):
+    """UPSERT de linhas vindas de outra réplica, resolvendo conflitos pela regra da tabela"""
+    key = REPLICATED_TABLES[table]
+    rows = [dict(zip(columns, row)) for row in rows]
+    if key == 'evento':
+        for row in rows:
+            # Linhas de antes do id de evento: o mesmo valor que a migração local dá
+            if row.get('evento') is None:
+                row['evento'] = f"legado:{row.get('id')}:{row.get('timestamp') or ''}"
+    if table == 'logs':
+        # Meses já arquivados aqui não voltam para a tabela
+        archived = _logs_archived_before(conn)
+        rows = [row for row in rows if not row.get('timestamp') or row['timestamp'] >= archived]
+        # acao_code é refeito pelo nome: cada réplica numera suas ações
+        conn.executemany("INSERT OR IGNORE INTO acoes (nome) VALUES (?)",
+                         {(row['acao'],) for row in rows if row.get('acao')})
+    if table in LWW_COLUMNS:
+        version = LWW_COLUMNS[table]
+        tombstones = dict(conn.execute("SELECT pk, deleted_at FROM _tombstones WHERE tbl = ?", (table,)))
+        rows = [row for row in rows if str(row.get(version) or '') > tombstones.get(row.get(key), '')]
+    if not rows:
+        return
+
+    columns = [col for col in rows[0] if col in local_columns and col != LOCAL_ID_COLUMNS.get(table)]
+    values, params = [], [[] for _ in rows]
+    for col in columns:
+        if (table, col) == ('logs', 'acao_code'):
+            values.append("(SELECT code FROM acoes WHERE nome = ?)")
+            source = 'acao'
+        else:
+            values.append("?")
+            source = col
+        for row, row_params in zip(rows, params):
+            row_params.append(_decode_value(row.get(source)))
+
+    updates = [f"{col}=MAX({table}.{col}, excluded.{col})" if col in MONOTONIC_COLUMNS.get(table, ())
+               else f"{col}=excluded.{col}"
+               for col in columns if col != key and col not in COUNTER_COLUMNS.get(table, ())]
+    if table in IMMUTABLE_TABLES or not updates:
+        conflict = "NOTHING"
+    elif table in LWW_COLUMNS:
+        version = LWW_COLUMNS[table]
+        conflict = f"UPDATE SET {', '.join(updates)} WHERE excluded.{version} > COALESCE({table}.{version}, '')"
+    else:
+        conflict = f"UPDATE SET {', '.join(updates)}"
+    # UPSERT (e não REPLACE) para que os triggers de UPDATE locais vejam a alteração
+    conn.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(values)}) "
+        f"ON CONFLICT({key}) DO {conflict}",
+        params
+    )
+
+
+def _can_merge(table, local_columns):
+    """Este banco já tem a chave e a coluna de versão (LWW) da tabela?"""
+    return {REPLICATED_TABLES[table], LWW_COLUMNS.get(table, REPLICATED_TABLES[table])} <= local_columns
+
+
+def _merge_delete(conn, table, pk, deleted_at=None):
+    """Exclusão feita por outra réplica; nas tabelas LWW só vale se a linha local for mais antiga"""
+    key = REPLICATED_TABLES[table]
+    if table not in LWW_COLUMNS or not deleted_at:
+        conn.execute(f"DELETE FROM {table} WHERE {key}=?", (pk,))
+        return
+    version = LWW_COLUMNS[table]
+    conn.execute(f"DELETE FROM {table} WHERE {key}=? AND COALESCE({version}, '') <= ?", (pk, deleted_at))
+    conn.execute("""INSERT INTO _tombstones (tbl, pk, deleted_at) VALUES (?, ?, ?)
+                    ON CONFLICT (tbl, pk) DO UPDATE SET deleted_at = MAX(deleted_at, excluded.deleted_at)""",
+                 (table, pk, deleted_at))
+
+
+def _apply_segment(conn, data):
+    """Aplica um segmento baixado do Drive no banco local.
+
+    Devolve False se alguma linha ficou de fora por falta de uma migração local;
+    o segmento então é reaplicado num próximo replay (a mescla é idempotente).
+    """
+    local_columns = {}
+    complete = True
+    for line in gzip.decompress(data).decode('utf-8').splitlines():
+        if not line:
+            continue
+        entry = json.loads(line)
+        table = entry['t']
+        if table not in REPLICATED_TABLES:
+            continue
+        if table not in local_columns:
+            local_columns[table] = _table_columns(conn, table)
+        if not _can_merge(table, local_columns[table]):
+            # Tabela (ou coluna de versão) de uma migração que este banco ainda não rodou
+            complete = False
+            continue
+        row = entry['r']
+        if row is None:
+            _merge_delete(conn, table, entry['k'], entry.get('d'))
+        else:
+            if not set(row) <= local_columns[table]:
+                # Colunas que este banco ainda não tem: a linha inteira espera a migração
+                # (mesclada pela metade, o reenvio não completaria as colunas novas)
+                complete = False
+                continue
+            _merge_rows(conn, table, list(row), [list(row.values())], local_columns[table])
+    return complete
+
+
+def _merge_archive_cutoff(conn):
+    """A outra réplica arquivou meses de logs: eles saem daqui também (os resumos não mudam)"""
+    try:
+        row = conn.execute("SELECT valor FROM remoto.app_config WHERE chave = 'logs_arquivados_ate'").fetchone()
+    except sqlite3.OperationalError:
+        return
+    if row is None or row[0] <= _logs_archived_before(conn):
+        return
+    conn.execute("INSERT OR REPLACE INTO app_config (chave, valor) VALUES ('arquivando_logs', '1')")
+    conn.execute("DELETE FROM logs WHERE timestamp < ?", (row[0],))
+    conn.execute("DELETE FROM app_config WHERE chave = 'arquivando_logs'")
+    conn.execute("INSERT OR REPLACE INTO app_config (chave, valor) VALUES ('logs_arquivados_ate', ?)", (row[0],))
+
+
+def _merge_remote_base(meta):
+    """Mescla no banco local a base que outra réplica enviou (nada local se perde)"""
+    with tempfile.TemporaryDirectory() as workdir:
+        raw_path = _fetch_snapshot(meta['id'], workdir)
+        conn = sqlite3.connect(DB_FILENAME)
+        try:
+            conn.execute("ATTACH DATABASE ? AS remoto", (raw_path,))
+            remote_tables = {row[0] for row in conn.execute(
+                "SELECT name FROM remoto.sqlite_master WHERE type='table'")}
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO _replication (key, value) VALUES ('replaying', 1)")
+                _merge_archive_cutoff(conn)
+                for table in REPLICATED_TABLES:
+                    local_columns = _table_columns(conn, table)
+                    if table not in remote_tables or not _can_merge(table, local_columns):
+                        continue
+                    cursor = conn.execute(f"SELECT * FROM remoto.{table}")
+                    columns = [d[0] for d in cursor.description]
+                    while True:
+                        rows = cursor.fetchmany(MERGE_CHUNK_ROWS)
+                        if not rows:
+                            break
+                        _merge_rows(conn, table, columns, rows, local_columns)
+                if '_tombstones' in remote_tables:
+                    for table, pk, deleted_at in conn.execute(
+                            "SELECT tbl, pk, deleted_at FROM remoto._tombstones").fetchall():
+                        if table in LWW_COLUMNS and _can_merge(table, _table_columns(conn, table)):
+                            _merge_delete(conn, table, pk, deleted_at)
+                if '_applied_segments' in remote_tables:
+                    # O que a base remota já incorporou agora também está aqui
+                    conn.execute("INSERT OR IGNORE INTO _applied_segments SELECT name FROM remoto._applied_segments")
+                conn.execute("DELETE FROM _replication WHERE key='replaying'")
+            conn.execute("DETACH DATABASE remoto")
+        finally:
             conn.close()
-            st.warning(f"Arquivo {DB_FILENAME} não encontrado no Drive. Criado novo banco local.")
-            return False
-            
-        file_id = files[0]['id']
-        request = service.files().get_media(fileId=file_id)
-        with io.FileIO(DB_FILENAME, 'wb') as fh:
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
+
+
+def _has_unsent_changes():
+    conn = sqlite3.connect(DB_FILENAME)
+    try:
+        return conn.execute("SELECT 1 FROM _changes LIMIT 1").fetchone() is not None
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def _segment_name(seq):
+    return f"{SEGMENT_PREFIX}{seq:012d}-{_replica_id}.jsonl.gz"
+
+
+def _segment_seq(name):
+    return int(name[len(SEGMENT_PREFIX):].split('.')[0].split('-')[0])
+
+
+def _is_legacy_segment(name):
+    """Segmentos enviados antes das réplicas assinarem o nome (auth.db.seg-<seq>.jsonl.gz)"""
+    return '-' not in name[len(SEGMENT_PREFIX):].split('.')[0]
+
+
+def _list_segments():
+    """Lista os segmentos no Drive como (seq, nome, id), ordenados por seq"""
+    return sorted((_segment_seq(name), name, file_id) for name, file_id in storage_backend().list(SEGMENT_PREFIX))
+
+
+def _replay_segments():
+    """Baixa e aplica os segmentos (de qualquer réplica) que o banco local ainda não tem"""
+    global _segments_since_base
+    segments = _list_segments()
+    conn = sqlite3.connect(DB_FILENAME)
+    try:
+        base_seq = _local_seq(conn)
+        applied = {row[0] for row in conn.execute("SELECT name FROM _applied_segments")}
+        _segments_since_base = len(segments)
+        # Segmentos antigos (sem réplica no nome) até o seq local já estão na base
+        pending = [(seq, name, file_id) for seq, name, file_id in segments
+                   if name not in applied and not (_is_legacy_segment(name) and seq <= base_seq)]
+        if not pending:
+            return
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO _replication (key, value) VALUES ('replaying', 1)")
+            for seq, name, file_id in pending:
+                if _apply_segment(conn, _download_bytes(file_id)):
+                    conn.execute("INSERT OR IGNORE INTO _applied_segments (name) VALUES (?)", (name,))
+                    base_seq = max(base_seq, seq)
+            conn.execute("DELETE FROM _replication WHERE key='replaying'")
+            _set_local_seq(conn, base_seq)
+    finally:
+        conn.close()
+
+
+def _ship_segment():
+    """Envia as linhas alteradas desde o último sync como um segmento novo"""
+    global _segments_since_base
+    conn = sqlite3.connect(DB_FILENAME)
+    try:
+        seq, data = _build_segment(conn)
+        if seq is None:
+            return
+        name = _segment_name(seq)
+        # Nome único por réplica: criar nunca sobrescreve o segmento de outro processo
+        storage_backend().create(name, data)
+        with conn:
+            conn.execute("DELETE FROM _changes WHERE seq <= ?", (seq,))
+            conn.execute("INSERT OR IGNORE INTO _applied_segments (name) VALUES (?)", (name,))
+            _set_local_seq(conn, seq)
+        _segments_since_base = (_segments_since_base or 0) + 1
+    finally:
+        conn.close()
+
+
+def _sync_changes():
+    """Sincroniza o banco: segmento incremental ou, quando preciso, snapshot base"""
+    with _drive_lock:
+        if (_remote_meta is None or _segments_since_base is None or _base_outdated
+                or _segments_since_base >= COMPACT_EVERY_SEGMENTS):
+            _upload_db()
+        else:
+            _ship_segment()
+
+
+# Metadados da última versão remota trazida (ou enviada) por este processo
+_remote_meta = None
+_last_checked = None  # instante (monotonic) da última consulta ao Drive
+_db_generation = 0    # muda sempre que o auth.db local é substituído ou recriado
+
+
+# Migrações do esquema: o database.py registra a sua função migrate(conn)
+# (drive_utils não importa database, que depende dele)
+_schema_migrator = None
+_base_outdated = False  # esquema local mais novo que a base do Drive: enviar base nova
+
+
+def set_schema_migrator(migrate):
+    global _schema_migrator
+    _schema_migrator = migrate
+
+
+def _migrate_local():
+    """Leva o auth.db baixado ao esquema atual (antes do replay dos segmentos)"""
+    global _base_outdated
+    if _schema_migrator is None:
+        return
+    conn = sqlite3.connect(DB_FILENAME, timeout=30, isolation_level=None)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _schema_migrator(conn)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        if conn.execute("PRAGMA user_version").fetchone()[0] != version:
+            # Sem isso cada processo novo migraria de novo a mesma base antiga
+            _base_outdated = True
+    finally:
+        conn.close()
+    # Triggers de replicação das tabelas e colunas que a migração criou
+    enable_change_log()
+
+
+def db_generation():
+    """Identifica a cópia atual do auth.db (chave para caches que dependem do esquema)"""
+    return _db_generation
+
+
+def _refresh_seconds():
+    try:
+        return float(st.secrets["drive_sync"]["refresh_seconds"])
+    except Exception:
+        return DB_REFRESH_SECONDS
+
+
+def _meta_key(meta):
+    return (meta.get('md5Checksum'), meta.get('modifiedTime'), meta.get('version'), meta.get('headRevisionId'))
+
+
+def _has_pending_upload():
+    with _sync_cond:
+        return _dirty_since is not None
+
+
+def download_db_from_drive(force=False):
+    """Faz download do banco de dados do Google Drive ou cria um novo se não existir.
+
+    O download completo acontece uma vez por processo. Depois disso, dentro da
+    janela DB_REFRESH_SECONDS nada é consultado; fora dela, só os metadados são
+    comparados e o arquivo é baixado apenas se a versão remota mudou.
+    """
+    global _remote_meta, _last_checked, _db_generation
+    has_local = os.path.exists(DB_FILENAME)
+    if (not force and has_local and _last_checked is not None
+            and time.monotonic() - _last_checked < _refresh_seconds()):
         return True
-        
+    try:
+        with _drive_lock:
+            # Alterações locais ainda não enviadas são mais novas que o Drive
+            if has_local and _remote_meta is not None and _has_pending_upload():
+                return True
+
+            meta = storage_backend().find(DB_FILENAME)
+            _last_checked = time.monotonic()
+
+            if meta is None:
+                # Se não encontrar o arquivo, cria um banco de dados vazio local
+                conn = sqlite3.connect(DB_FILENAME)
+                conn.close()
+                if not has_local:
+                    _db_generation += 1
+                st.warning(f"Arquivo {DB_FILENAME} não encontrado no Drive. Criado novo banco local.")
+                return False
+
+            if (force or not has_local or _remote_meta is None
+                    or _meta_key(meta) != _meta_key(_remote_meta)):
+                if not force and has_local and _has_unsent_changes():
+                    # Escritas locais que o Drive ainda não tem: mescla em vez de substituir
+                    _migrate_local()
+                    _merge_remote_base(meta)
+                else:
+                    _restore_snapshot(meta['id'])
+                _remote_meta = meta
+                _db_generation += 1
+                enable_change_log()
+                conn = sqlite3.connect(DB_FILENAME)
+                with conn:
+                    # O que já está na base não precisa ser reenviado
+                    conn.execute("DELETE FROM _changes WHERE seq <= ?", (_local_seq(conn),))
+                conn.close()
+
+            # A base pode estar atrás: aplica os segmentos enviados depois dela,
+            # já no esquema atual (segmentos de réplicas migradas trazem colunas novas)
+            _migrate_local()
+            _replay_segments()
+            if _base_outdated:
+                schedule_db_upload()
+            return True
+
     except HttpError as error:
         st.error(f"Erro ao baixar arquivo: {error}")
         return False
@@ -150,24 +981,67 @@ def download_db_from_drive():
         return False
 
 
+def _merge_newer_base():
+    """Antes de sobrescrever a base: se outra réplica enviou uma, mescla-a aqui primeiro.
+
+    A API do Drive não tem upload condicional (If-Match), então a checagem só
+    estreita a janela de corrida; o que escapar volta pelos segmentos e tombstones.
+    """
+    global _remote_meta
+    for _ in range(UPLOAD_CONFLICT_ATTEMPTS):
+        current = storage_backend().find(DB_FILENAME)
+        if current is None or (_remote_meta is not None and _meta_key(current) == _meta_key(_remote_meta)):
+            return
+        logger.info("Base do Drive alterada por outra réplica; mesclando antes do upload")
+        enable_change_log()
+        _merge_remote_base(current)
+        _remote_meta = current
+        _replay_segments()
+    raise RuntimeError(f"{DB_FILENAME} no Drive mudou {UPLOAD_CONFLICT_ATTEMPTS} vezes durante o upload")
+
+
+def _upload_db():
+    """Envia o auth.db local inteiro como snapshot base (levanta exceção em caso de falha)"""
+    global _remote_meta, _segments_since_base, _base_outdated
+    with _drive_lock:
+        enable_change_log()
+        _merge_newer_base()
+        conn = sqlite3.connect(DB_FILENAME)
+        try:
+            with conn:
+                row = conn.execute("SELECT MAX(seq) FROM _changes").fetchone()
+                seq = max(row[0] or 0, _local_seq(conn))
+                # A base carrega o seq até onde já incorpora as alterações
+                _set_local_seq(conn, seq)
+
+            with tempfile.TemporaryDirectory() as workdir:
+                snapshot = _make_snapshot(workdir)
+                meta = storage_backend().put(DB_FILENAME, snapshot)
+            # A versão que acabamos de enviar é a que temos localmente: não baixar de novo
+            _remote_meta = meta
+
+            with conn:
+                conn.execute("DELETE FROM _changes WHERE seq <= ?", (seq,))
+            applied = {row[0] for row in conn.execute("SELECT name FROM _applied_segments")}
+
+            # Compactação: segmentos já incorporados à base não são mais necessários
+            deleted = []
+            for segment_seq, name, file_id in _list_segments():
+                if name in applied or (_is_legacy_segment(name) and segment_seq <= seq):
+                    storage_backend().delete(file_id)
+                    deleted.append((name,))
+            with conn:
+                conn.executemany("DELETE FROM _applied_segments WHERE name = ?", deleted)
+        finally:
+            conn.close()
+        _segments_since_base = 0
+        _base_outdated = False
+
+
 def upload_db_to_drive():
-    """Faz upload do banco de dados para o Google Drive"""
+    """Faz upload do banco de dados para o Google Drive (síncrono)"""
     try:
-        folder_id = get_folder_id()
-        results = service.files().list(
-            q=f"name='{DB_FILENAME}' and '{folder_id}' in parents and trashed=false",
-            spaces='drive',
-            fields="files(id, name)",
-            pageSize=1
-        ).execute()
-        files = results.get('files', [])
-        file_metadata = {'name': DB_FILENAME, 'parents': [folder_id]}
-        media = MediaFileUpload(DB_FILENAME, mimetype='application/x-sqlite3')
-        if files:
-            file_id = files[0]['id']
-            service.files().update(fileId=file_id, media_body=media).execute()
-        else:
-            service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+        _upload_db()
         return True
     except HttpError as error:
         st.error(f"Erro ao enviar arquivo: {error}")
@@ -175,3 +1049,115 @@ def upload_db_to_drive():
     except Exception as e:
         st.error(f"Erro inesperado: {str(e)}")
         return False
+
+
+# === ARQUIVOS DE LOGS ANTIGOS (ver log_archive.py) ===
+# Um arquivo por mês (e por rodada de arquivamento), nunca reescrito
+ARCHIVE_PREFIX = "logs-arquivo-"  # logs-arquivo-2025-03.000000012345.csv.gz
+
+
+def list_archives():
+    """(nome, id) dos arquivos de logs no Drive, em ordem de nome (= mês)"""
+    with _drive_lock:
+        return sorted(storage_backend().list(ARCHIVE_PREFIX))
+
+
+def upload_archive(name, path):
+    """Envia o arquivo `path` como `name`; se já existir (rodada repetida), mantém o que está lá"""
+    with _drive_lock:
+        existing = storage_backend().find(name)
+        if existing:
+            return existing['id']
+        return storage_backend().create(name, path)['id']
+
+
+def download_archive(file_id):
+    with _drive_lock:
+        return _download_bytes(file_id)
+
+
+# === SINCRONIZAÇÃO EM SEGUNDO PLANO (WRITE-BEHIND) ===
+_sync_cond = threading.Condition()
+_dirty_since = None   # instante (monotonic) da primeira escrita ainda não enviada
+_last_write = None    # instante (monotonic) da escrita mais recente
+_retry_at = None      # após falhas: não tenta de novo antes deste instante
+_sync_thread = None
+
+
+def schedule_db_upload():
+    """Marca o banco local como alterado e retorna imediatamente.
+
+    Escritas próximas são agrupadas em um único upload, feito por uma thread
+    de fundo após SYNC_DEBOUNCE_SECONDS sem novas escritas (ou, no máximo,
+    SYNC_MAX_DELAY_SECONDS depois da primeira).
+    """
+    global _dirty_since, _last_write, _sync_thread
+    with _sync_cond:
+        now = time.monotonic()
+        if _dirty_since is None:
+            _dirty_since = now
+        _last_write = now
+        if _sync_thread is None or not _sync_thread.is_alive():
+            _sync_thread = threading.Thread(target=_sync_worker, name="drive-sync", daemon=True)
+            _sync_thread.start()
+        _sync_cond.notify()
+
+
+def _sync_worker():
+    global _dirty_since, _last_write, _retry_at
+    failures = 0
+    while True:
+        with _sync_cond:
+            while _dirty_since is None:
+                _sync_cond.wait()
+            # Debounce: espera a rajada acabar, respeitando o atraso máximo
+            while _dirty_since is not None:
+                deadline = min(_last_write + SYNC_DEBOUNCE_SECONDS,
+                               _dirty_since + SYNC_MAX_DELAY_SECONDS)
+                if _retry_at is not None:
+                    deadline = max(deadline, _retry_at)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                _sync_cond.wait(remaining)
+            if _dirty_since is None:
+                # flush_db_upload() já enviou enquanto esperávamos
+                continue
+            _dirty_since = _last_write = None
+        try:
+            _sync_changes()
+            failures = 0
+            with _sync_cond:
+                _retry_at = None
+        except Exception as e:
+            # Falhas permanentes (autenticação, conflito) não viram um sync a cada debounce
+            failures += 1
+            delay = min(SYNC_RETRY_SECONDS * 2 ** (failures - 1), SYNC_RETRY_MAX_SECONDS)
+            logger.warning("Falha no upload em segundo plano do %s (nova tentativa em %.0f s): %s",
+                           DB_FILENAME, delay, e)
+            with _sync_cond:
+                _retry_at = time.monotonic() + delay
+            # Mantém o banco marcado como pendente para nova tentativa
+            schedule_db_upload()
+
+
+def flush_db_upload():
+    """Envia imediatamente as alterações pendentes e aguarda o upload em andamento"""
+    global _dirty_since, _last_write
+    with _sync_cond:
+        pending = _dirty_since is not None
+        _dirty_since = _last_write = None
+        _sync_cond.notify()
+    # _drive_lock garante que nenhum upload da thread de fundo está em curso
+    with _drive_lock:
+        if not pending:
+            return True
+        try:
+            _sync_changes()
+            return True
+        except Exception as e:
+            logger.error("Falha ao enviar %s ao encerrar: %s", DB_FILENAME, e)
+            return False
+
+
+atexit.register(flush_db_upload)
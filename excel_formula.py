@@ -0,0 +1,484 @@
+# excel_formula.py - avaliação local de fórmulas do Excel em português
+#
+# Confere a fórmula do item 3 das respostas contra o exemplo numérico do item 4
+# sem precisar de outra chamada à OpenAI: a fórmula é avaliada com os dados do
+# exemplo (diâmetro em B2, altura em C2, como no prompt; senão os dados na ordem
+# em que aparecem) e o resultado tem que aparecer no item 4.
+
+import math
+import re
+
+
+class FormulaError(Exception):
+    """Fórmula inválida no Excel em português (sintaxe, função em inglês, #DIV/0!...)"""
+
+
+class UnsupportedFormula(Exception):
+    """Fórmula possivelmente válida, mas fora do que este avaliador sabe calcular"""
+
+
+# === ANÁLISE LÉXICA ===
+# Sem distinção de maiúsculas (=pi()*b2 vale no Excel); funções, células e
+# VERDADEIRO/FALSO saem do tokenize em maiúsculas
+TOKEN = re.compile(r"""
+    \s*(?:
+      (?P<num>\d+(?:,\d+)?(?:[eE][+-]?\d+)?)
+    | (?P<range>\$?[A-Z]{1,3}\$?\d+:\$?[A-Z]{1,3}\$?\d+)
+    | (?P<func>[A-ZÁÉÍÓÚÂÊÔÃÕÇ][A-ZÁÉÍÓÚÂÊÔÃÕÇ0-9.]*)\s*\(
+    | (?P<ref>\$?[A-Z]{1,3}\$?\d+)(?![A-Z0-9(])
+    | (?P<bool>VERDADEIRO|FALSO)(?![A-Z0-9(])
+    | (?P<str>"(?:[^"]|"")*")
+    | (?P<op><>|<=|>=|[-+*/^&=<>%();])
+    )""", re.VERBOSE | re.IGNORECASE)
+
+# Nomes em inglês: a fórmula não funcionaria no Excel em português
+ENGLISH_FUNCTIONS = {
+    "IF", "VLOOKUP", "HLOOKUP", "INDEX", "MATCH", "SUM", "AVERAGE", "MIN", "MAX", "ROUND",
+    "ROUNDUP", "ROUNDDOWN", "SQRT", "POWER", "AND", "OR", "NOT", "CEILING", "FLOOR", "TRUNC",
+}
+
+
+def tokenize(formula):
+    text = formula.strip()
+    if text.startswith("="):
+        text = text[1:]
+    tokens, pos = [], 0
+    while pos < len(text):
+        if text[pos:].strip() == "":
+            break
+        match = TOKEN.match(text, pos)
+        if not match:
+            raise FormulaError(f"trecho inválido: {text[pos:pos + 12].strip()!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ("func", "ref", "range", "bool"):
+            value = value.upper()
+        tokens.append((kind, value))
+        if kind == "func":
+            tokens.append(("op", "("))
+        pos = match.end()
+    return tokens
+
+
+# === ANÁLISE SINTÁTICA (gera uma árvore de tuplas) ===
+class _Parser:
+    COMPARISON = ("=", "<>", "<", ">", "<=", ">=")
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        kind, current = self.peek()
+        if kind is None or (value is not None and current != value):
+            raise FormulaError(f"esperado {value!r}" if value else "fórmula incompleta")
+        self.pos += 1
+        return kind, current
+
+    def parse(self):
+        if not self.tokens:
+            raise FormulaError("fórmula vazia")
+        node = self.comparison()
+        if self.pos != len(self.tokens):
+            raise FormulaError(f"sobrou {self.peek()[1]!r} na fórmula")
+        return node
+
+    def _binary(self, operators, operand):
+        node = operand()
+        while self.peek()[0] == "op" and self.peek()[1] in operators:
+            op = self.take()[1]
+            node = ("bin", op, node, operand())
+        return node
+
+    def comparison(self):
+        return self._binary(self.COMPARISON, self.concat)
+
+    def concat(self):
+        return self._binary(("&",), self.additive)
+
+    def additive(self):
+        return self._binary(("+", "-"), self.multiplicative)
+
+    def multiplicative(self):
+        return self._binary(("*", "/"), self.power)
+
+    def power(self):
+        return self._binary(("^",), self.unary)
+
+    def unary(self):
+        # No Excel o sinal vale antes da potência: =-2^2 dá 4
+        if self.peek() in (("op", "-"), ("op", "+")):
+            op = self.take()[1]
+            return ("neg", self.unary()) if op == "-" else self.unary()
+        node = self.primary()
+        while self.peek() == ("op", "%"):
+            self.take()
+            node = ("bin", "/", node, ("num", 100.0))
+        return node
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == "num":
+            return ("num", float(value.replace(",", ".")))
+        if kind == "str":
+            return ("str", value[1:-1].replace('""', '"'))
+        if kind == "bool":
+            return ("bool", value == "VERDADEIRO")
+        if kind == "ref":
+            return ("ref", value.replace("$", ""))
+        if kind == "range":
+            return ("range", value.replace("$", ""))
+        if kind == "func":
+            self.take("(")
+            args = []
+            if self.peek() != ("op", ")"):
+                args.append(self.comparison())
+                while self.peek() == ("op", ";"):
+                    self.take()
+                    args.append(self.comparison())
+            self.take(")")
+            return ("func", value, args)
+        if (kind, value) == ("op", "("):
+            node = self.comparison()
+            self.take(")")
+            return node
+        if (kind, value) == ("op", ";"):
+            raise FormulaError("';' fora de uma função")
+        raise FormulaError(f"{value!r} inesperado")
+
+
+def parse(formula):
+    return _Parser(tokenize(formula)).parse()
+
+
+# === AVALIAÇÃO ===
+def _split_ref(ref):
+    match = re.fullmatch(r"([A-Z]+)(\d+)", ref)
+    col = 0
+    for letter in match.group(1):
+        col = col * 26 + ord(letter) - 64
+    return col, int(match.group(2))
+
+
+def _col_name(col):
+    name = ""
+    while col:
+        col, rest = divmod(col - 1, 26)
+        name = chr(65 + rest) + name
+    return name
+
+
+def _flatten(values):
+    for value in values:
+        if isinstance(value, list):
+            yield from _flatten(value)
+        elif value is not None:
+            yield value
+
+
+def _number(value):
+    if isinstance(value, list):
+        raise FormulaError("#VALOR! (intervalo onde se espera um número)")
+    if value is None:
+        return 0.0
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, str):
+        try:
+            return float(value.replace(",", "."))
+        except ValueError:
+            raise FormulaError("#VALOR! (texto onde se espera um número)")
+    return float(value)
+
+
+def _excel_round(value, digits, mode="nearest"):
+    factor = 10 ** int(digits)
+    scaled = abs(value) * factor
+    if mode == "up":
+        scaled = math.ceil(round(scaled, 9))
+    elif mode == "down":
+        scaled = math.floor(round(scaled, 9))
+    else:
+        scaled = math.floor(scaled + 0.5)  # meio para longe do zero, como o Excel
+    return math.copysign(scaled / factor, value)
+
+
+def _procv(valor, tabela, coluna, aproximado=True):
+    coluna = int(_number(coluna))
+    if not isinstance(tabela, list) or not 1 <= coluna <= len(tabela[0]):
+        raise FormulaError("#REF! (coluna fora da tabela no PROCV)")
+    if aproximado:
+        found = None
+        for row in tabela:
+            if row[0] is not None and _number(row[0]) <= _number(valor):
+                found = row
+        if found is None:
+            raise FormulaError("#N/D (valor menor que o primeiro da tabela)")
+        return found[coluna - 1]
+    for row in tabela:
+        if row[0] == valor or (not isinstance(valor, str) and row[0] is not None
+                               and not isinstance(row[0], str) and _number(row[0]) == _number(valor)):
+            return row[coluna - 1]
+    raise FormulaError("#N/D (valor não encontrado no PROCV)")
+
+
+def _indice(tabela, linha, coluna=None):
+    if not isinstance(tabela, list):
+        tabela = [[tabela]]
+    linha = int(_number(linha))
+    coluna = int(_number(coluna)) if coluna is not None else 1
+    if len(tabela) == 1 and coluna == 1 and linha > 1:
+        linha, coluna = 1, linha  # intervalo de uma linha só: ÍNDICE(A1:D1; 3)
+    if not (1 <= linha <= len(tabela) and 1 <= coluna <= len(tabela[0])):
+        raise FormulaError("#REF! (posição fora do intervalo no ÍNDICE)")
+    return tabela[linha - 1][coluna - 1]
+
+
+def _divide(a, b):
+    if b == 0:
+        raise FormulaError("#DIV/0!")
+    return a / b
+
+
+def _sqrt(x):
+    if x < 0:
+        raise FormulaError("#NÚM! (raiz de número negativo)")
+    return math.sqrt(x)
+
+
+NUMERIC_FUNCTIONS = {
+    "PI": lambda: math.pi,
+    "ABS": abs,
+    "RAIZ": _sqrt,
+    "POTÊNCIA": lambda x, y: x ** y,
+    "INT": lambda x: float(math.floor(x)),
+    "TRUNCAR": lambda x, n=0: math.trunc(x * 10 ** int(n)) / 10 ** int(n),
+    "ARRED": lambda x, n=0: _excel_round(x, n),
+    "ARREDONDAR.PARA.CIMA": lambda x, n=0: _excel_round(x, n, "up"),
+    "ARREDONDAR.PARA.BAIXO": lambda x, n=0: _excel_round(x, n, "down"),
+    "MOD": lambda x, y: x - y * math.floor(_divide(x, y)),
+}
+AGGREGATE_FUNCTIONS = {
+    "SOMA": sum,
+    "MÉDIA": lambda xs: _divide(sum(xs), len(xs)),
+    "MÍNIMO": lambda xs: min(xs) if xs else 0.0,
+    "MÁXIMO": lambda xs: max(xs) if xs else 0.0,
+}
+ALIASES = {"POTENCIA": "POTÊNCIA", "MEDIA": "MÉDIA", "MINIMO": "MÍNIMO", "MAXIMO": "MÁXIMO",
+           "INDICE": "ÍNDICE", "NAO": "NÃO"}
+
+
+class _Evaluator:
+    def __init__(self, cells):
+        self.cells = cells
+
+    def cell(self, ref):
+        return self.cells.get(ref)
+
+    def range(self, ref):
+        start, end = ref.split(":")
+        (c1, r1), (c2, r2) = _split_ref(start), _split_ref(end)
+        return [[self.cells.get(f"{_col_name(c)}{r}") for c in range(min(c1, c2), max(c1, c2) + 1)]
+                for r in range(min(r1, r2), max(r1, r2) + 1)]
+
+    def eval(self, node):
+        kind = node[0]
+        if kind in ("num", "str", "bool"):
+            return node[1]
+        if kind == "ref":
+            return self.cell(node[1])
+        if kind == "range":
+            return self.range(node[1])
+        if kind == "neg":
+            return -_number(self.eval(node[1]))
+        if kind == "bin":
+            return self.binary(node[1], self.eval(node[2]), self.eval(node[3]))
+        return self.call(node[1], node[2])
+
+    def binary(self, op, left, right):
+        if op == "&":
+            return f"{'' if left is None else left}{'' if right is None else right}"
+        if op in _Parser.COMPARISON:
+            if isinstance(left, str) or isinstance(right, str):
+                left, right = str(left).upper(), str(right).upper()
+            else:
+                left, right = _number(left), _number(right)
+            return {"=": left == right, "<>": left != right, "<": left < right,
+                    ">": left > right, "<=": left <= right, ">=": left >= right}[op]
+        a, b = _number(left), _number(right)
+        if op == "+":
+            return a + b
+        if op == "-":
+            return a - b
+        if op == "*":
+            return a * b
+        if op == "/":
+            return _divide(a, b)
+        try:
+            return a ** b
+        except (OverflowError, ZeroDivisionError):
+            raise FormulaError("#NÚM!")
+
+    def call(self, name, args):
+        name = ALIASES.get(name, name)
+        if name in ENGLISH_FUNCTIONS:
+            raise FormulaError(f"função em inglês: {name}")
+        if name == "SE":
+            if not 2 <= len(args) <= 3:
+                raise FormulaError("SE precisa de 2 ou 3 argumentos")
+            if _number(self.eval(args[0])):
+                return self.eval(args[1])
+            return self.eval(args[2]) if len(args) == 3 else False
+        values = [self.eval(arg) for arg in args]
+        try:
+            if name in NUMERIC_FUNCTIONS:
+                return NUMERIC_FUNCTIONS[name](*[_number(v) for v in values])
+            if name in AGGREGATE_FUNCTIONS:
+                return AGGREGATE_FUNCTIONS[name]([_number(v) for v in _flatten(values)])
+            if name == "E":
+                return all(_number(v) for v in _flatten(values))
+            if name == "OU":
+                return any(_number(v) for v in _flatten(values))
+            if name == "NÃO":
+                return not _number(values[0])
+            if name == "PROCV":
+                return _procv(*values)
+            if name == "ÍNDICE":
+                return _indice(*values)
+        except TypeError:
+            raise FormulaError(f"número de argumentos errado em {name}")
+        raise UnsupportedFormula(name)
+
+
+def evaluate(formula, cells=None):
+    """Valor da fórmula com as células informadas ({'B2': 0.3, 'C2': 3})"""
+    return _Evaluator(cells or {}).eval(parse(formula))
+
+
+def referenced_cells(formula):
+    """(células avulsas, há intervalos?) usadas pela fórmula"""
+    tokens = tokenize(formula)
+    refs = sorted({value.replace("$", "") for kind, value in tokens if kind == "ref"},
+                  key=lambda ref: (_split_ref(ref)[1], _split_ref(ref)[0]))
+    return refs, any(kind == "range" for kind, _ in tokens)
+
+
+# === CONFERÊNCIA DAS RESPOSTAS (item 3 × item 4) ===
+FORMULA_BLOCK = re.compile(r"```\s*(=[^`]+?)\s*```")
+SECTION = re.compile(r"\*\*([1-4])\.[^*]*\*\*")
+# 1.234,56 / 0,212 / 3 (ignora referências como B2)
+BR_NUMBER = re.compile(r"(?<![A-Za-z\d,.])(\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:,\d+)?)(?![\d])")
+# Resultados do exemplo: números logo depois de "=", "≈" ou "→"; não são dados
+RESULT_MARK = re.compile(r"[=≈→]\s*$")
+# Células fixadas pelo prompt (config_prompt.SYSTEM_PROMPT, item 5)
+LABELED_CELLS = {
+    "B2": re.compile(r"di[âa]metro(?:\s+de)?\s*[:=]?\s*$", re.IGNORECASE),
+    "C2": re.compile(r"altura(?:\s+de)?\s*[:=]?\s*$", re.IGNORECASE),
+}
+MAX_INPUTS = 4
+
+
+class Check:
+    """Resultado da conferência: status ok / divergente / erro / nao_verificavel"""
+
+    def __init__(self, status, formula=None, detail=""):
+        self.status = status
+        self.formula = formula
+        self.detail = detail
+
+    def __repr__(self):
+        return f"Check({self.status!r}, {self.formula!r}, {self.detail!r})"
+
+
+def _sections(text):
+    marks = list(SECTION.finditer(text))
+    return {int(m.group(1)): text[m.end():marks[i + 1].start() if i + 1 < len(marks) else len(text)]
+            for i, m in enumerate(marks)}
+
+
+def _example_numbers(text):
+    """(dados, resultados, células fixadas) do exemplo; cada número é (texto, valor)"""
+    text = FORMULA_BLOCK.sub(" ", text)
+    inputs, results, labeled = [], [], {}
+    for match in BR_NUMBER.finditer(text):
+        raw = match.group(1)
+        number = (raw, float(raw.replace(".", "").replace(",", ".")))
+        before = text[:match.start()]
+        for ref, label in LABELED_CELLS.items():
+            if ref not in labeled and label.search(before):
+                labeled[ref] = number[1]
+                break
+        else:
+            if RESULT_MARK.search(before):
+                results.append(number)
+                continue
+        if number[1] not in [value for _, value in inputs]:
+            inputs.append(number)
+    return inputs, results, labeled
+
+
+def _bind(cells, inputs, labeled):
+    """Valores das células: B2/C2 pelo rótulo, as demais com os dados na ordem"""
+    values = {ref: labeled[ref] for ref in cells if ref in labeled}
+    rest = [value for _, value in inputs if value not in values.values()]
+    for ref in cells:
+        if ref not in values:
+            if not rest:
+                return None
+            values[ref] = rest.pop(0)
+    return values
+
+
+def _matches(result, raw, value):
+    """O resultado bate com o número do texto, considerando as casas exibidas"""
+    decimals = len(raw.split(",")[1]) if "," in raw else 0
+    return abs(result - value) <= max(0.5 * 10 ** -decimals, 0.01 * abs(value)) + 1e-9
+
+
+def format_br(value):
+    return f"{value:.6g}".replace(".", ",")
+
+
+def check_answer(text):
+    """Confere a fórmula do item 3 usando os números do exemplo (item 4)"""
+    sections = _sections(text)
+    block = FORMULA_BLOCK.search(sections.get(3, ""))
+    if not block:
+        return Check("nao_verificavel", detail="sem fórmula no item 3")
+    formula = block.group(1)
+    inputs, results, labeled = _example_numbers(sections.get(4, ""))
+    try:
+        cells, has_ranges = referenced_cells(formula)
+        parse(formula)
+        values = _bind(cells, inputs, labeled)
+        if has_ranges or len(cells) > MAX_INPUTS or not results or values is None:
+            return Check("nao_verificavel", formula, "exemplo sem dados suficientes")
+
+        result = _number(evaluate(formula, values))
+        if any(_matches(result, raw, value) for raw, value in results):
+            return Check("ok", formula)
+        used = " e ".join(f"{ref}={format_br(v)}" for ref, v in values.items()) or "sem células"
+        return Check("divergente", formula,
+                     f"avaliada com {used} dá {format_br(result)}, valor que não aparece no item 4")
+    except UnsupportedFormula as exc:
+        return Check("nao_verificavel", formula, f"função {exc} não avaliada localmente")
+    except FormulaError as exc:
+        return Check("erro", formula, str(exc))
+
+
+def replace_formula(text, old, new):
+    """Troca a fórmula do item 3 (só a primeira ocorrência)"""
+    return text.replace(f"```{old}```", f"```{new}```", 1) if f"```{old}```" in text \
+        else text.replace(old, new, 1)
+
+
+def extract_formula(text):
+    """Primeira fórmula entre ``` ``` (ou a primeira linha começando com '=')"""
+    block = FORMULA_BLOCK.search(text)
+    if block:
+        return block.group(1).strip()
+    match = re.search(r"^\s*(=\S.*)$", text, re.MULTILINE)
+    return match.group(1).strip() if match else None
@@ -0,0 +1,118 @@
+# exports.py - exportação de usuários, logs e resumos (CSV.gz ou Parquet) em blocos
+#
+# As linhas saem do SQLite em blocos de EXPORT_CHUNK_ROWS (cursor.fetchmany) e
+# são gravadas, já comprimidas, num arquivo temporário. A memória usada não
+# depende do tamanho da tabela; só o arquivo final (comprimido) vai para o
+# botão de download.
+
+import csv
+import gzip
+import tempfile
+from datetime import timedelta
+
+from database import connection, flush_logs
+
+EXPORT_CHUNK_ROWS = 5000
+FORMATS = {"CSV (.csv.gz)": "csv", "Parquet": "parquet"}
+
+# nome -> consulta, coluna de data (filtro de período), ordem e tipos das colunas (Parquet)
+EXPORTS = {
+    "usuarios": {
+        "sql": "SELECT email, created_at, last_login FROM users",
+        "where": [],
+        "date_column": "created_at",
+        "order": "created_at, email",
+        "columns": [("email", "string"), ("created_at", "string"), ("last_login", "string")],
+    },
+    "logs": {
+        "sql": """SELECT l.id, l.timestamp, l.email, COALESCE(a.nome, l.acao) AS acao
+                  FROM logs l LEFT JOIN acoes a ON a.code = l.acao_code""",
+        "where": [],
+        "date_column": "l.timestamp",
+        "order": "l.timestamp, l.id",
+        "columns": [("id", "int64"), ("timestamp", "string"), ("email", "string"), ("acao", "string")],
+    },
+    "logs_por_dia": {
+        "sql": """SELECT r.dia, a.nome AS acao, r.total
+                  FROM logs_por_dia r LEFT JOIN acoes a ON a.code = r.acao_code""",
+        "where": ["r.total > 0"],
+        "date_column": "r.dia",
+        "order": "r.dia, a.nome",
+        "columns": [("dia", "string"), ("acao", "string"), ("total", "int64")],
+    },
+}
+
+
+def _select(name, start=None, end=None):
+    """SQL e parâmetros da exportação; `start`/`end` são datas (inclusive)"""
+    spec = EXPORTS[name]
+    where, params = list(spec["where"]), []
+    if start is not None:
+        where.append(f"{spec['date_column']} >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        where.append(f"{spec['date_column']} < ?")
+        params.append((end + timedelta(days=1)).isoformat())
+    sql = spec["sql"]
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return f"{sql} ORDER BY {spec['order']}", params
+
+
+def _chunks(name, start, end):
+    if name == "logs":
+        flush_logs()
+    sql, params = _select(name, start, end)
+    with connection() as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                return
+            yield rows
+
+
+def _write_csv(name, chunks, out):
+    with gzip.open(out, "wt", encoding="utf-8", newline="") as gz:
+        writer = csv.writer(gz)
+        writer.writerow([column for column, _ in EXPORTS[name]["columns"]])
+        for rows in chunks:
+            writer.writerows(rows)
+
+
+def _write_parquet(name, chunks, out):
+    # pyarrow já vem como dependência do Streamlit
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    columns = EXPORTS[name]["columns"]
+    schema = pa.schema([(column, getattr(pa, kind)()) for column, kind in columns])
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for rows in chunks:
+            # Cada bloco vira um row group
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema,
+            ))
+
+
+def export_to_file(name, fmt, out, start=None, end=None):
+    """Grava a exportação `name` em `out` (caminho ou arquivo binário)"""
+    writer = _write_parquet if fmt == "parquet" else _write_csv
+    writer(name, _chunks(name, start, end), out)
+
+
+def export_bytes(name, fmt, start=None, end=None):
+    """Arquivo pronto para o st.download_button (só o conteúdo comprimido fica na memória)"""
+    with tempfile.TemporaryFile() as tmp:
+        export_to_file(name, fmt, tmp, start, end)
+        tmp.seek(0)
+        return tmp.read()
+
+
+def file_name(name, fmt, start=None, end=None):
+    periodo = "".join(f"_{d:%Y%m%d}" for d in (start, end) if d is not None)
+    return f"{name}{periodo}." + ("parquet" if fmt == "parquet" else "csv.gz")
+
+
+def mime_type(fmt):
+    return "application/vnd.apache.parquet" if fmt == "parquet" else "application/gzip"
@@ -0,0 +1,265 @@
+# local_answers.py - respostas calculadas localmente para os cálculos mais comuns
+#
+# Pilar cilíndrico, laje (área/volume), traço de concreto e equivalência de
+# barras são variações das mesmas contas. Quando a pergunta cai em um desses
+# casos, a resposta nas 4 seções é montada aqui (instantânea, sem custo e com
+# os números sempre certos); nos demais casos main.py segue para a OpenAI.
+
+import math
+import re
+import unicodedata
+
+from response_formatter import format_response
+
+# Massas específicas (t/m³) usadas no consumo de cimento do traço em massa
+MASSA_CIMENTO = 3.1
+MASSA_AREIA = 2.65
+MASSA_BRITA = 2.7
+SACO_CIMENTO_KG = 50
+FATOR_AC_PADRAO = 0.5
+
+# Assuntos que pedem mais do que a conta direta: ficam com o modelo
+FORA_DO_ESCOPO = re.compile(
+    r"\b(procv|proch|indice|corresp|se\(|tabela|grafico|macro|vba|custo|preco|orcamento|"
+    r"retangular|quadrad|sapata|viga|escada|formatacao|condicional)")
+
+NUMERO = r"(\d+(?:[.,]\d+)?)"
+UNIDADE = r"\s*(milimetros?|centimetros?|metros?|mm|cm|m)?(?![a-z²³0-9])"
+CONECTOR = r"\s*(?:de|do|da|com|igual a|=|:)?\s*"
+BARRAS = r"(?:barras?|ferros?|vergalh[a-z]*)"
+BITOLA = r"(\d+(?:[.,]\d+)?)\s*mm"
+# Qualquer número da pergunta (não pega o 3 de "m3")
+NUMERO_SOLTO = re.compile(r"(?<![a-z\d.,])\d+(?:[.,]\d+)?")
+# Número seguido do nome de outra medida ("diâmetro 3 m de altura") pertence a ela
+OUTRA_MEDIDA = r"(?!\s*(?:[a-z]+\s+)?(?:de\s+)?(?:altura|diametro|raio|comprimento|largura|espessura))"
+
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _to_float(value):
+    return float(value.replace(",", "."))
+
+
+def _to_meters(value, unit, default_unit="m"):
+    unit = unit or default_unit
+    factor = 0.001 if unit[0] == "m" and unit[:2] in ("mm", "mi") else 0.01 if unit[0] == "c" else 1.0
+    return value * factor
+
+
+def _fmt(value, casas=2):
+    """Número no padrão brasileiro: 1.234,56"""
+    text = f"{value:,.{casas}f}"
+    return text.replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _measure(text, names, small=False):
+    """Medida em metros associada a um dos nomes ("diâmetro de 30 cm", "3 m de altura").
+
+    Sem unidade, medidas `small` (diâmetro, espessura) acima de 5 são lidas em cm.
+    """
+    names = "|".join(names)
+    for pattern in (rf"(?:{names}){CONECTOR}{NUMERO}{UNIDADE}{OUTRA_MEDIDA}",
+                    rf"{NUMERO}{UNIDADE}\s*(?:de\s+)?(?:{names})"):
+        match = re.search(pattern, text)
+        if match:
+            value, unit = _to_float(match.group(1)), match.group(2)
+            if unit is None and small and value > 5:
+                unit = "cm"
+            return _to_meters(value, unit)
+    return None
+
+
+def _numbers_in(text):
+    """Quantos números a pergunta traz: se sobrar algum sem leitura, a conta não é feita aqui"""
+    return len(NUMERO_SOLTO.findall(text))
+
+
+def _quantity(text, nouns):
+    match = re.search(rf"(\d+)\s*(?:{nouns})", text)
+    return int(match.group(1)) if match else None
+
+
+# === PILAR CILÍNDRICO ===
+def _pilar(text):
+    if not re.search(r"\b(pilar|pilares|coluna|colunas)\b", text):
+        return None
+    # Sem forma informada vale o pilar cilíndrico dos exemplos do SYSTEM_PROMPT
+    if not re.search(r"cilindr|circular|redond|diametro|raio|volume", text):
+        return None
+    diametro = _measure(text, ["diametro"], small=True)
+    if diametro is None:
+        raio = _measure(text, ["raio"], small=True)
+        diametro = raio * 2 if raio is not None else None
+    altura = _measure(text, ["altura", "alto", "comprimento", "pe direito"])
+    quantidade = _quantity(text, r"pilares|colunas")
+    lidos = sum(value is not None for value in (diametro, altura, quantidade))
+    # Os valores do SYSTEM_PROMPT só valem para perguntas sem nenhum número
+    if _numbers_in(text) == 0:
+        diametro, altura, quantidade = 0.30, 3.0, 10
+    elif diametro is None or altura is None or _numbers_in(text) > lidos:
+        return None
+    quantidade = quantidade or 1
+
+    volume = math.pi * (diametro / 2) ** 2 * altura
+    d, h = _fmt(diametro), _fmt(altura)
+    linhas = [
+        "1. Explicação técnica breve: O pilar cilíndrico tem base circular; o volume de concreto "
+        "é a área da base (π × raio²) multiplicada pela altura. O raio é metade do diâmetro.",
+        "2. Fórmula matemática clara: Volume = π × (diâmetro/2)² × altura",
+        "3. Fórmula Excel aplicável: Com o diâmetro (m) em B2 e a altura (m) em C2, cole em B4: "
+        "```=PI()*(B2/2)^2*C2```",
+        f"4. Exemplo numérico completo: Para diâmetro de {d} m e altura de {h} m: "
+        f"Volume de 1 pilar = π × ({d}/2)² × {h} ≈ {_fmt(volume, 3)} m³",
+    ]
+    if quantidade > 1:
+        linhas.append(f"Volume total = {_fmt(volume, 3)} × {quantidade} ≈ "
+                      f"{_fmt(volume * quantidade, 3)} m³ para {quantidade} pilares")
+    return "\n".join(linhas)
+
+
+# === LAJE ===
+def _laje(text):
+    if not re.search(r"\blajes?\b", text):
+        return None
+    comprimento = _measure(text, ["comprimento"])
+    largura = _measure(text, ["largura"])
+    match = re.search(rf"{NUMERO}{UNIDADE}\s*(?:[x×]|por)\s*{NUMERO}{UNIDADE}", text)
+    if match and comprimento is None and largura is None:
+        unit = match.group(4) or match.group(2)
+        comprimento = _to_meters(_to_float(match.group(1)), match.group(2) or unit)
+        largura = _to_meters(_to_float(match.group(3)), unit)
+    espessura = _measure(text, ["espessura", "altura"], small=True)
+    quer_volume = espessura is not None or re.search(r"volume|concreto|m3|m³|espessura", text)
+
+    lidos = sum(value is not None for value in (comprimento, largura, espessura))
+    if _numbers_in(text) == 0:
+        comprimento, largura = 5.0, 4.0
+        if quer_volume:
+            espessura = 0.10
+    elif (comprimento is None or largura is None or (quer_volume and espessura is None)
+          or _numbers_in(text) > lidos):
+        return None
+
+    c, l = _fmt(comprimento), _fmt(largura)
+    area = comprimento * largura
+    if not quer_volume:
+        return "\n".join([
+            "1. Explicação técnica breve: A área da laje retangular é o produto do comprimento "
+            "pela largura, ambos em metros.",
+            "2. Fórmula matemática clara: Área = comprimento × largura",
+            "3. Fórmula Excel aplicável: Com o comprimento (m) em B2 e a largura (m) em C2, "
+            "cole em B4: ```=B2*C2```",
+            f"4. Exemplo numérico completo: Para {c} m por {l} m: "
+            f"Área = {c} × {l} = {_fmt(area)} m²",
+        ])
+    e = _fmt(espessura)
+    return "\n".join([
+        "1. Explicação técnica breve: O volume de concreto da laje maciça é a área "
+        "(comprimento × largura) multiplicada pela espessura, tudo em metros.",
+        "2. Fórmula matemática clara: Volume = comprimento × largura × espessura",
+        "3. Fórmula Excel aplicável: Com o comprimento (m) em B2, a largura (m) em C2 e a "
+        "espessura (m) em D2, cole em B4: ```=B2*C2*D2```",
+        f"4. Exemplo numérico completo: Para {c} m × {l} m com {e} m de espessura: "
+        f"Área = {c} × {l} = {_fmt(area)} m²; Volume = {_fmt(area)} × {e} = "
+        f"{_fmt(area * espessura, 3)} m³",
+    ])
+
+
+# === TRAÇO DE CONCRETO ===
+def _traco(text):
+    match = re.search(r"\b1\s*:\s*(\d+(?:[.,]\d+)?)\s*:\s*(\d+(?:[.,]\d+)?)", text)
+    if not match or not re.search(r"traco|dosagem|concreto", text):
+        return None
+    areia, brita = _to_float(match.group(1)), _to_float(match.group(2))
+    fator = re.search(r"(?:a/c|agua[/ ]cimento|fator agua)\D{0,12}(\d+(?:[.,]\d+)?)", text)
+    agua = _to_float(fator.group(1)) if fator else FATOR_AC_PADRAO
+    volume = re.search(rf"{NUMERO}\s*(?:m3|m³|metros? cubicos?)", text)
+    volume = _to_float(volume.group(1)) if volume else 1.0
+
+    consumo = 1000 / (1 / MASSA_CIMENTO + areia / MASSA_AREIA + brita / MASSA_BRITA + agua)
+    cimento = consumo * volume
+    a, p, x = _fmt(areia, 1), _fmt(brita, 1), _fmt(agua)
+    divisor = (f"1/{_fmt(MASSA_CIMENTO, 1)}+{_fmt(areia, 1)}/{_fmt(MASSA_AREIA)}"
+               f"+{_fmt(brita, 1)}/{_fmt(MASSA_BRITA, 1)}+{_fmt(agua)}")
+    return "\n".join([
+        f"1. Explicação técnica breve: No traço em massa 1 : {a} : {p} (cimento : areia : brita) "
+        f"com fator água/cimento {x}, o consumo de cimento por m³ vem da soma dos volumes "
+        f"absolutos dos materiais (massas específicas: cimento {_fmt(MASSA_CIMENTO, 1)}, areia "
+        f"{_fmt(MASSA_AREIA)} e brita {_fmt(MASSA_BRITA, 1)} t/m³). Areia, brita e água saem "
+        "multiplicando o cimento pelas proporções.",
+        f"2. Fórmula matemática clara: Cimento (kg/m³) = 1000 ÷ (1/{_fmt(MASSA_CIMENTO, 1)} + "
+        f"{a}/{_fmt(MASSA_AREIA)} + {p}/{_fmt(MASSA_BRITA, 1)} + {x}); "
+        f"Areia = Cimento × {a}; Brita = Cimento × {p}; Água = Cimento × {x}",
+        "3. Fórmula Excel aplicável: Com o volume de concreto (m³) em B2, cole em B4 para obter "
+        f"o cimento em kg: ```=B2*1000/({divisor})``` (sacos de {SACO_CIMENTO_KG} kg: "
+        f"```=B4/{SACO_CIMENTO_KG}```)",
+        f"4. Exemplo numérico completo: Para {_fmt(volume)} m³ de concreto: "
+        f"Cimento = {_fmt(volume)} × {_fmt(consumo, 1)} ≈ {_fmt(cimento, 1)} kg "
+        f"(≈ {_fmt(cimento / SACO_CIMENTO_KG, 1)} sacos de {SACO_CIMENTO_KG} kg); "
+        f"Areia ≈ {_fmt(cimento * areia, 1)} kg; Brita ≈ {_fmt(cimento * brita, 1)} kg; "
+        f"Água ≈ {_fmt(cimento * agua, 1)} litros",
+    ])
+
+
+# === EQUIVALÊNCIA DE BARRAS ===
+def _barras(text):
+    if not re.search(r"barras?|vergalh|bitola|ferro", text):
+        return None
+    if not re.search(r"equival|substitu|trocar|troca|converter|conversao|quantas|mesma area", text):
+        return None
+    diametros = {_to_float(d) for d in re.findall(BITOLA, text)}
+    if len(diametros) != 2:
+        return None
+    # Original: o diâmetro que tem a quantidade ("6 barras de 16mm") ou que vem
+    # depois de substituir/trocar; novo: o que vem depois de "quantas"
+    dona = re.search(rf"(\d+)\s*{BARRAS}\s*(?:de\s+)?{BITOLA}", text)
+    substituida = re.search(rf"(?:substitu|troca)[a-z]*\s+(?:as\s+|os\s+)?{BARRAS}?\s*(?:de\s+)?{BITOLA}", text)
+    pedida = re.search(rf"quant[ao]s\s+{BARRAS}?\s*(?:de\s+)?{BITOLA}", text)
+    original = _to_float(dona.group(2)) if dona else _to_float(substituida.group(1)) if substituida else None
+    novo = _to_float(pedida.group(1)) if pedida else None
+    if original is None and novo is None:
+        return None
+    original = original if original is not None else (diametros - {novo}).pop()
+    novo = novo if novo is not None else (diametros - {original}).pop()
+    if original == novo:
+        return None
+    quantidade = int(dona.group(1)) if dona else _quantity(text, BARRAS) or 1
+
+    area_original = math.pi * (original / 10) ** 2 / 4  # cm²
+    area_nova = math.pi * (novo / 10) ** 2 / 4
+    exato = quantidade * original ** 2 / novo ** 2
+    necessarias = math.ceil(round(exato, 6))
+    o, n = _fmt(original, 1), _fmt(novo, 1)
+    return "\n".join([
+        "1. Explicação técnica breve: Barras são equivalentes quando somam a mesma área de aço. "
+        "A área de uma barra é π × diâmetro² ÷ 4, então a quantidade nova é a antiga multiplicada "
+        "pela razão entre os quadrados dos diâmetros, arredondada para cima.",
+        "2. Fórmula matemática clara: Barras novas = barras originais × (diâmetro original ÷ "
+        "diâmetro novo)², arredondado para cima",
+        "3. Fórmula Excel aplicável: Com a quantidade de barras em B2, o diâmetro original (mm) em "
+        "C2 e o diâmetro novo (mm) em D2, cole em B4: ```=ARREDONDAR.PARA.CIMA(B2*C2^2/D2^2;0)```",
+        f"4. Exemplo numérico completo: Área de 1 barra de {o} mm = π × {_fmt(original / 10)}² ÷ 4 ≈ "
+        f"{_fmt(area_original, 3)} cm²; de 1 barra de {n} mm ≈ {_fmt(area_nova, 3)} cm². "
+        f"Para {quantidade} barras de {o} mm: {quantidade} × ({o} ÷ {n})² ≈ {_fmt(exato)} → "
+        f"{necessarias} barras de {n} mm ({_fmt(necessarias * area_nova, 3)} cm² ≥ "
+        f"{_fmt(quantidade * area_original, 3)} cm²)",
+    ])
+
+
+TEMPLATES = (_barras, _traco, _pilar, _laje)
+
+
+def local_answer(question):
+    """Resposta formatada se a pergunta cair em um dos cálculos conhecidos; senão None"""
+    text = _normalize(question)
+    if len(text) > 300 or FORA_DO_ESCOPO.search(text):
+        return None
+    for template in TEMPLATES:
+        raw = template(text)
+        if raw:
+            return format_response(raw)
+    return None
+
@@ -0,0 +1,144 @@
+# log_archive.py - retenção da tabela logs em arquivos mensais no Drive
+#
+# Logs mais antigos que o prazo de retenção (meses inteiros) são gravados em
+# arquivos CSV.gz mensais e imutáveis na pasta banco-coeso do Drive, apagados
+# do auth.db e o banco passa por VACUUM. Como o auth.db vai inteiro para o
+# Drive a cada snapshot, o banco e o sync deixam de crescer com o histórico.
+# Os resumos do dashboard (logs_por_dia) não mudam com o arquivamento.
+#
+#     python log_archive.py   -> arquiva o que passou do prazo
+
+import io
+import logging
+import os
+import tempfile
+from datetime import date, timedelta
+
+import streamlit as st
+
+from database import connection, transaction, query, flush_logs
+from drive_utils import ARCHIVE_PREFIX, list_archives, upload_archive, download_archive, upload_db_to_drive
+from exports import export_to_file
+
+LOG_RETENTION_DAYS = 180  # pode ser sobrescrito: [logs] retention_days = 365
+
+logger = logging.getLogger(__name__)
+
+
+def retention_days():
+    try:
+        return int(st.secrets["logs"]["retention_days"])
+    except Exception:
+        return LOG_RETENTION_DAYS
+
+
+def archive_cutoff(today=None):
+    """Logs antes desta data podem ir para o arquivo (sempre o 1º dia de um mês)"""
+    limit = (today or date.today()) - timedelta(days=retention_days())
+    return limit.replace(day=1)
+
+
+def _month_range(mes):
+    """('AAAA-MM') -> (primeiro dia, primeiro dia do mês seguinte)"""
+    start = date.fromisoformat(f"{mes}-01")
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+# === ARQUIVAMENTO ===
+def pending_months(cutoff=None):
+    """(mês 'AAAA-MM', linhas, maior id) dos logs anteriores ao corte"""
+    flush_logs()
+    return query(
+        """SELECT substr(timestamp, 1, 7), COUNT(*), MAX(id) FROM logs
+           WHERE timestamp < ? GROUP BY 1 ORDER BY 1""",
+        ((cutoff or archive_cutoff()).isoformat(),),
+    )
+
+
+def _delete_month(start, end, max_id):
+    with transaction() as conn:
+        # Resumos do dashboard e triggers de replicação ficam mudos: os totais
+        # continuam valendo e a exclusão segue no snapshot enviado ao final
+        conn.execute("INSERT OR REPLACE INTO app_config (chave, valor) VALUES ('arquivando_logs', '1')")
+        conn.execute("INSERT OR REPLACE INTO _replication (key, value) VALUES ('replaying', 1)")
+        conn.execute("DELETE FROM logs WHERE timestamp >= ? AND timestamp < ? AND id <= ?",
+                     (start.isoformat(), end.isoformat(), max_id))
+        conn.execute("DELETE FROM _replication WHERE key = 'replaying'")
+        conn.execute("DELETE FROM app_config WHERE chave = 'arquivando_logs'")
+        conn.execute(
+            """INSERT INTO app_config (chave, valor) VALUES ('logs_arquivados_ate', ?)
+               ON CONFLICT (chave) DO UPDATE SET valor = max(valor, excluded.valor)""",
+            (end.isoformat(),),
+        )
+
+
+def archive_old_logs(progress=None):
+    """Arquiva os meses vencidos; devolve [(mês, linhas)] arquivados.
+
+    Cada mês é enviado ao Drive antes de sair do banco local. Se a rodada for
+    interrompida, a próxima gera o mesmo nome de arquivo e só conclui a exclusão.
+    """
+    months = pending_months()
+    arquivados = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for i, (mes, total, max_id) in enumerate(months, 1):
+            try:
+                start, end = _month_range(mes)
+            except (TypeError, ValueError):
+                logger.warning("Logs com timestamp inválido não foram arquivados: %r", mes)
+                continue
+            name = f"{ARCHIVE_PREFIX}{mes}.{max_id:012d}.csv.gz"
+            path = os.path.join(workdir, name)
+            export_to_file("logs", "csv", path, start, end - timedelta(days=1))
+            upload_archive(name, path)
+            _delete_month(start, end, max_id)
+            arquivados.append((mes, total))
+            if progress:
+                progress(i, len(months))
+    if arquivados:
+        with connection() as conn:
+            conn.execute("VACUUM")
+        # Base nova (já sem os meses arquivados) substitui a do Drive
+        upload_db_to_drive()
+    return arquivados
+
+
+# === CONSULTA AOS ARQUIVOS ===
+def archived_months():
+    """{mês 'AAAA-MM': [ids dos arquivos no Drive]}"""
+    meses = {}
+    for name, file_id in list_archives():
+        meses.setdefault(name[len(ARCHIVE_PREFIX):].split(".")[0], []).append(file_id)
+    return meses
+
+
+@st.cache_data(show_spinner=False, max_entries=24)
+def _read_archive(file_id):
+    # Arquivos são imutáveis: o id basta como chave de cache
+    import pandas as pd
+    return pd.read_csv(io.BytesIO(download_archive(file_id)), compression="gzip", dtype={"email": str})
+
+
+def query_archives(file_ids, email=None, acao=None):
+    """Logs arquivados dos arquivos indicados, filtrados por prefixo de e-mail e ação"""
+    import pandas as pd
+    frames = [_read_archive(file_id) for file_id in file_ids]
+    if not frames:
+        return pd.DataFrame(columns=["id", "timestamp", "email", "acao"])
+    df = pd.concat(frames, ignore_index=True)
+    if email:
+        df = df[df["email"].fillna("").str.startswith(email)]
+    if acao:
+        df = df[df["acao"] == acao]
+    return df.sort_values(["timestamp", "id"], ascending=False, ignore_index=True)
+
+
+# === LINHA DE COMANDO ===
+if __name__ == "__main__":
+    from drive_utils import download_db_from_drive
+    from database import init_db
+
+    download_db_from_drive()
+    init_db()
+    for mes, total in archive_old_logs():
+        print(f"{mes}: {total} logs arquivados")
@@ -1,16 +1,24 @@
 # main.py otimizado com SYSTEM_PROMPT e CSS externos
 
+from startup_timing import StartupTimer
+timer = StartupTimer("main.py")
+
 import streamlit as st
-from openai import OpenAI
 import time
-import re
-import sqlite3
+import itertools
 import bcrypt
-from datetime import datetime
-from drive_utils import download_db_from_drive, upload_db_to_drive  # NOVO
+from drive_utils import download_db_from_drive, db_generation  # NOVO
+from database import transaction, init_db, registrar_log, is_valid_email, update_last_login, get_password_hash, registrar_uso_tokens, registrar_validacao
 from config_prompt import SYSTEM_PROMPT  # AGORA EXTERNO
+from response_formatter import ResponseFormatter
+from answer_cache import get_cached_answer, store_answer
+from token_budget import PROMPT_TOKEN_BUDGET, trim_history
+from openai_client import get_client, stream_chat
+from local_answers import local_answer
+from excel_formula import check_answer, extract_formula, replace_formula
+from session_tokens import SESSION_PARAM, create_session, resume_session, revoke_session, token_from_request
 import os
-os.environ['PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION'] = 'python'
+timer.mark("imports")
 
 # === CONFIG PÁGINA ===
 st.set_page_config(
@@ -21,58 +29,22 @@ st.set_page_config(
 )
 
 download_db_from_drive()  # NOVO
+timer.mark("drive")
 
 # === CSS EXTERNO ===
-with open("custom_style.css") as f:
-    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+@st.cache_data
+def load_css(path, mtime):
+    # mtime faz parte da chave: editar o arquivo invalida o cache
+    with open(path) as f:
+        return f"<style>{f.read()}</style>"
 
-# === BANCO DE DADOS ===
-def init_db():
-    conn = sqlite3.connect('auth.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                    email TEXT PRIMARY KEY,
-                    senha TEXT,
-                    created_at TIMESTAMP,
-                    last_login TIMESTAMP
-                )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    email TEXT,
-                    acao TEXT,
-                    timestamp TIMESTAMP
-                )''')
-    conn.commit()
-    conn.close()
-
-# === LOG ===
-def registrar_log(email, acao):
-    conn = sqlite3.connect('auth.db')
-    c = conn.cursor()
-    c.execute("INSERT INTO logs (email, acao, timestamp) VALUES (?, ?, ?)", (email, acao, datetime.now()))
-    conn.commit()
-    conn.close()
-    upload_db_to_drive()  # NOVO
-
-def is_valid_email(email):
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-def update_last_login(email):
-    conn = sqlite3.connect('auth.db')
-    c = conn.cursor()
-    c.execute("UPDATE users SET last_login=? WHERE email=?", (datetime.now(), email))
-    conn.commit()
-    conn.close()
-    upload_db_to_drive()  # NOVO
+st.markdown(load_css("custom_style.css", os.path.getmtime("custom_style.css")), unsafe_allow_html=True)
+timer.mark("css")
 
+# === BANCO DE DADOS ===
 def validar_login(email, senha):
-    conn = sqlite3.connect('auth.db')
-    c = conn.cursor()
-    c.execute("SELECT senha FROM users WHERE email=?", (email,))
-    result = c.fetchone()
-    conn.close()
-    if result and bcrypt.checkpw(senha.encode(), result[0]):
+    hashed = get_password_hash(email)
+    if hashed and bcrypt.checkpw(senha.encode(), hashed):
         return True
     return False
 
@@ -97,24 +69,55 @@ def login_screen():
         if st.button("Acessar"):
             if is_valid_email(email) and senha:
                 if validar_login(email, senha):
-                    update_last_login(email)
-                    registrar_log(email, "Login Usuário")
+                    # Uma transação só (um sync com o Drive) para login, log e sessão
+                    with transaction():
+                        update_last_login(email)
+                        registrar_log(email, "Login Usuário")
+                        token = create_session(email)
                     st.session_state['authenticated'] = True
                     st.session_state['user_email'] = email
+                    st.session_state['session_token'] = token
                     st.session_state['sidebar_state'] = 'expanded'
+                    # Na URL: recarregar a página retoma a sessão sem pedir a senha
+                    if token:
+                        st.query_params[SESSION_PARAM] = token
                     st.rerun()
                 else:
                     st.error("E-mail ou senha incorretos.")
             else:
                 st.error("Por favor, preencha e-mail e senha válidos.")
 
+def encerrar_sessao():
+    revoke_session(st.session_state.pop('session_token', None))
+    st.session_state['authenticated'] = False
+    st.session_state.pop('user_email', None)
+    st.query_params.pop(SESSION_PARAM, None)
+
 # === EXECUÇÃO ===
-init_db()
+@st.cache_resource
+def ensure_db(generation):
+    # Migrações e triggers uma vez por cópia do auth.db (de novo se o Drive trouxer outra)
+    init_db()
+
+ensure_db(db_generation())
+timer.mark("banco")
 if 'authenticated' not in st.session_state:
     st.session_state['authenticated'] = False
     st.session_state['sidebar_state'] = 'expanded'
+    # Página recarregada ou reconexão: retoma pelo token (busca indexada + HMAC, sem bcrypt)
+    token = token_from_request()
+    email = resume_session(token)
+    if email:
+        st.session_state['authenticated'] = True
+        st.session_state['user_email'] = email
+        st.session_state['session_token'] = token
+elif st.session_state.get('session_token') and not resume_session(st.session_state['session_token']):
+    # Sessão revogada no painel administrativo ou expirada
+    encerrar_sessao()
 if not st.session_state['authenticated']:
     login_screen()
+    timer.mark("login")
+    timer.report()
     st.stop()
 
 # === INTERFACE ===
@@ -148,8 +151,7 @@ with st.sidebar:
             st.rerun()
     with col2:
         if st.button("🚪 Sair"):
-            st.session_state['authenticated'] = False
-            st.session_state.pop('user_email', None)
+            encerrar_sessao()
             st.rerun()
 
 st.title("🏗️ Assistente de Excel para Construção Civil")
@@ -159,77 +161,122 @@ if 'openai' not in st.secrets:
     st.error("API Key não configurada. Verifique o arquivo secrets.toml")
     st.stop()
 
-client = OpenAI(api_key=st.secrets["openai"]["api_key"])
-
-def format_response(text):
-    # Remove caracteres indesejados
-    text = re.sub(r'\{.*?\}', '', text)
-    text = re.sub(r'\\[a-z]+', '', text)
+# Um cliente por processo (pool de conexões, limite de taxa e retries em openai_client.py)
+client = get_client(st.secrets["openai"]["api_key"])
 
-    for num, title in titles.items():
-        # Remove linhas como "1. Explicação técnica breve" ou apenas "Explicação técnica breve"
-        pattern = rf"(?i)\b{num}\s*{title}\b[:：]?\s*|\b{title}\b[:：]?\s*"
-        text = re.sub(pattern, '', text)
+# Intervalo mínimo entre redesenhos da resposta durante o streaming
+STREAM_RENDER_INTERVAL = 0.05
+MAX_COMPLETION_TOKENS = 600
+FORMULA_FIX_MAX_TOKENS = 120
+CACHEABLE_STATUSES = ("ok", "corrigida")  # só respostas com a fórmula conferida vão para o cache
 
-    # Divide em seções numéricas
-    sections = re.split(r'(\d+\.)', text)
-    formatted_text = ""
+def prompt_token_budget():
+    # Pode ser sobrescrito em secrets.toml: [openai] prompt_token_budget = 4000
+    try:
+        return int(st.secrets["openai"]["prompt_token_budget"])
+    except Exception:
+        return PROMPT_TOKEN_BUDGET
 
-    for i in range(1, len(sections), 2):
-        section_num = sections[i].replace('.', '')
-        section_content = sections[i + 1].strip()
+def stream_answer(msg_box, messages):
+    """Gera a resposta com streaming, desenhando em msg_box; devolve (texto final, usage)"""
+    with st.spinner('Processando sua pergunta...'):
+        stream = stream_chat(
+            client,
+            model="gpt-3.5-turbo",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=MAX_COMPLETION_TOKENS
+        )
+        # Espera só o primeiro trecho; o resto é desenhado conforme chega
+        chunks = iter(stream)
+        first = next(chunks, None)
 
-        if section_num == '1':
-            formatted_text += f"**1. Explicação técnica breve**\n\n{section_content}\n\n"
-        elif section_num == '2':
-            formatted_text += f"**2. Fórmula matemática clara**\n\n{section_content}\n\n"
-        elif section_num == '3':
-            formatted_text += f"**3. Fórmula Excel aplicável**\n\n{section_content}\n\n"
-        elif section_num == '4':
-            formatted_text += f"**4. Exemplo numérico completo**\n\n{section_content}\n\n"
+    formatter = ResponseFormatter()
+    last_render = 0.0
+    for delta in itertools.chain([first] if first else [], chunks):
+        formatter.feed(delta)
+        now = time.monotonic()
+        if now - last_render >= STREAM_RENDER_INTERVAL:
+            msg_box.markdown(formatter.render() + "▌", unsafe_allow_html=True)
+            last_render = now
+    return formatter.finish(), stream.usage
 
-    return formatted_text.strip()
+def verify_formula(messages, formatted):
+    """Confere a fórmula do item 3 com o exemplo do item 4; se não bater, pede só a fórmula corrigida.
 
+    Devolve (resposta, status da conferência).
+    """
+    check = check_answer(formatted)
+    status = check.status
+    if status in ("divergente", "erro"):
+        pedido = (f"A fórmula do item 3 (```{check.formula}```) não confere: {check.detail}. "
+                  "Responda somente com a fórmula corrigida entre ``` ```, em português, com ; "
+                  "separando os argumentos e vírgula decimal, usando as mesmas células, "
+                  "de modo que reproduza o resultado do item 4.")
+        try:
+            with st.spinner('Conferindo a fórmula...'):
+                stream = stream_chat(
+                    client,
+                    model="gpt-3.5-turbo",
+                    messages=messages + [{"role": "assistant", "content": formatted},
+                                         {"role": "user", "content": pedido}],
+                    temperature=0,
+                    max_tokens=FORMULA_FIX_MAX_TOKENS
+                )
+                nova = extract_formula("".join(stream))
+            if nova:
+                corrigida = replace_formula(formatted, check.formula, nova)
+                if check_answer(corrigida).status == "ok":
+                    formatted, status = corrigida, "corrigida"
+        except Exception:
+            pass  # Sem correção a resposta original continua valendo
+    registrar_validacao(status, check.formula, check.detail or None)
+    return formatted, status
 
-def limit_history(messages, max=10):
-    if len(messages) > max + 1:
-        return [messages[0]] + messages[-max:]
-    return messages
+# === CHAT ===
+# Fragmento: uma pergunta nova redesenha só a conversa (CSS, sidebar e login não rodam de novo)
+@st.fragment
+def chat_area():
+    for msg in st.session_state.messages:
+        if msg["role"] != "system":
+            with st.chat_message(msg["role"]):
+                st.markdown(msg["content"], unsafe_allow_html=True)
 
-for msg in st.session_state.messages:
-    if msg["role"] != "system":
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["content"], unsafe_allow_html=True)
+    if prompt := st.chat_input("Digite sua dúvida sobre Excel para construção civil..."):
+        with st.chat_message("user"):
+            st.markdown(prompt)
+        st.session_state.messages.append({"role": "user", "content": prompt})
 
-if prompt := st.chat_input("Digite sua dúvida sobre Excel para construção civil..."):
-    with st.chat_message("user"):
-        st.markdown(prompt)
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    st.session_state.messages = limit_history(st.session_state.messages)
+        # Só a primeira pergunta da conversa usa o cache: as seguintes dependem do histórico
+        first_question = len(st.session_state.messages) == 2
 
-    with st.chat_message("assistant"):
-        try:
-            with st.spinner('Processando sua pergunta...'):
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=st.session_state.messages,
-                    temperature=0.7,
-                    max_tokens=600
-                )
-                content = response.choices[0].message.content
-                content = re.sub(r'\{.*?\}', '', content)
-                content = re.sub(r'\\[a-z]+', '', content)
-                formatted = format_response(content)
+        with st.chat_message("assistant"):
+            try:
                 msg_box = st.empty()
-                full_resp = ""
-                for para in formatted.split('\n\n'):
-                    if para.strip():
-                        full_resp += para + "\n\n"
-                        msg_box.markdown(full_resp + "▌", unsafe_allow_html=True)
-                        time.sleep(0.2)
-                msg_box.markdown(full_resp, unsafe_allow_html=True)
-            st.session_state.messages.append({"role": "assistant", "content": formatted})
-        except Exception:
-            err = "⚠️ Ocorreu um erro ao processar sua pergunta. Por favor, tente novamente."
-            st.error(err)
-            st.session_state.messages.append({"role": "assistant", "content": err})
+                # Cálculos conhecidos (pilar, laje, traço, barras) são respondidos localmente
+                formatted = local_answer(prompt)
+                if formatted is None and first_question:
+                    formatted = get_cached_answer(prompt)
+                if formatted is None:
+                    # A tela mostra o histórico todo; à API vai só o que cabe no orçamento
+                    messages, estimated, dropped = trim_history(
+                        st.session_state.messages, MAX_COMPLETION_TOKENS, prompt_token_budget())
+                    formatted, usage = stream_answer(msg_box, messages)
+                    formatted, status = verify_formula(messages, formatted)
+                    registrar_uso_tokens(
+                        st.session_state['user_email'], estimated,
+                        usage.prompt_tokens if usage else None,
+                        usage.completion_tokens if usage else None,
+                        dropped)
+                    if first_question and formatted and status in CACHEABLE_STATUSES:
+                        store_answer(prompt, formatted)
+                msg_box.markdown(formatted, unsafe_allow_html=True)
+                st.session_state.messages.append({"role": "assistant", "content": formatted})
+            except Exception:
+                err = "⚠️ Ocorreu um erro ao processar sua pergunta. Por favor, tente novamente."
+                st.error(err)
+                st.session_state.messages.append({"role": "assistant", "content": err})
+
+chat_area()
+timer.mark("interface")
+timer.report()
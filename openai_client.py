@@ -0,0 +1,242 @@
+# openai_client.py - cliente OpenAI compartilhado pelo processo (limite de taxa, retries e deduplicação)
+
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import streamlit as st
+
+# O SDK da OpenAI (httpx, pydantic) só é importado na primeira pergunta:
+# a tela de login não depende dele
+
+# Limites da conta na OpenAI. Podem ser sobrescritos em secrets.toml:
+# [openai] max_concurrent = 8 / requests_per_minute = 300
+MAX_CONCURRENT_REQUESTS = 8
+REQUESTS_PER_MINUTE = 300
+REQUEST_TIMEOUT_SECONDS = 60.0
+
+# Retries: backoff exponencial com jitter; Retry-After do servidor tem prioridade
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    try:
+        return int(st.secrets["openai"][name])
+    except Exception:
+        return default
+
+
+# === CLIENTE E LIMITADOR (um por processo) ===
+@st.cache_resource
+def get_client(api_key):
+    """Cliente único: o pool de conexões HTTP (keep-alive) é reaproveitado entre sessões e reruns"""
+    from openai import OpenAI
+    # Os retries são feitos aqui (stream_chat), junto com o limitador do processo
+    return OpenAI(api_key=api_key, timeout=REQUEST_TIMEOUT_SECONDS, max_retries=0)
+
+
+class RateLimiter:
+    """Semáforo (chamadas simultâneas) + balde de fichas (chamadas por minuto)"""
+
+    def __init__(self, max_concurrent, per_minute):
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._rate = per_minute / 60.0
+        self._capacity = float(max_concurrent)  # rajada máxima
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0  # pausa de todos após um 429 com Retry-After
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _take_token(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+    @contextmanager
+    def slot(self):
+        self._slots.acquire()
+        try:
+            self._take_token()
+            yield
+        finally:
+            self._slots.release()
+
+
+@st.cache_resource
+def get_limiter():
+    return RateLimiter(_setting("max_concurrent", MAX_CONCURRENT_REQUESTS),
+                       _setting("requests_per_minute", REQUESTS_PER_MINUTE))
+
+
+# === RETRIES ===
+def _is_retryable(error):
+    from openai import APIConnectionError, APIStatusError
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return isinstance(error, APIConnectionError)  # inclui timeouts
+
+
+def _retry_after(error):
+    """Segundos pedidos pelo servidor (retry-after-ms / Retry-After), se houver"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except Exception:
+        return None
+
+
+def _backoff(attempt, error):
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, BACKOFF_MAX_SECONDS * 3))
+    return delay
+
+
+# === CHAMADAS EM ANDAMENTO (perguntas idênticas e simultâneas viram uma só) ===
+class _Flight:
+    """Resposta de uma chamada sendo recebida; várias sessões podem acompanhá-la"""
+
+    def __init__(self):
+        self.deltas = []
+        self.usage = None
+        self.error = None
+        self.done = False
+        self._cond = threading.Condition()
+
+    def append(self, delta):
+        with self._cond:
+            self.deltas.append(delta)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def follow(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.deltas) and not self.done:
+                    self._cond.wait()
+                batch = self.deltas[index:]
+                index += len(batch)
+                finished = self.done and index >= len(self.deltas)
+            yield from batch
+            if finished:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class ChatStream:
+    """Trechos de texto da resposta; `usage` é preenchido ao final.
+
+    Quem pegou carona na chamada de outra sessão recebe usage=None (não gastou tokens).
+    """
+
+    def __init__(self, flight, leader):
+        self._flight = flight
+        self.leader = leader
+
+    def __iter__(self):
+        return self._flight.follow()
+
+    @property
+    def usage(self):
+        return self._flight.usage if self.leader else None
+
+
+def _flight_key(params):
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _run(key, flight, client, limiter, params):
+    """Thread de fundo: faz a chamada (com retries) e publica os trechos no flight"""
+    error = None
+    try:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                with limiter.slot():
+                    stream = client.chat.completions.create(
+                        stream=True, stream_options={"include_usage": True}, **params
+                    )
+                    for chunk in stream:
+                        # O último trecho não tem choices, só a contagem de tokens
+                        flight.usage = getattr(chunk, "usage", None) or flight.usage
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            flight.append(delta)
+                break
+            except Exception as exc:
+                # Depois que o texto começou a chegar, repetir duplicaria a resposta
+                if flight.deltas or attempt == MAX_ATTEMPTS or not _is_retryable(exc):
+                    raise
+                delay = _backoff(attempt, exc)
+                if getattr(exc, "status_code", None) == 429:
+                    limiter.pause(delay)
+                logger.warning("OpenAI: tentativa %d falhou (%s); nova tentativa em %.1fs",
+                               attempt, exc, delay)
+                time.sleep(delay)
+    except Exception as exc:
+        error = exc
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.finish(error)
+
+
+def stream_chat(client, **params):
+    """Inicia (ou acompanha, se já houver uma idêntica em andamento) uma chamada com streaming"""
+    key = _flight_key(params)
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if leader:
+        threading.Thread(target=_run, args=(key, flight, client, get_limiter(), params),
+                         name="openai-stream", daemon=True).start()
+    return ChatStream(flight, leader)
@@ -1,60 +1,27 @@
 # painel_admin.py com integração ao Google Drive (compartilhado com main.py)
 
+from startup_timing import StartupTimer
+timer = StartupTimer("painel_admin.py")
+
 import streamlit as st
-import sqlite3
-import pandas as pd
-import re
 import bcrypt
 from datetime import datetime, timedelta
 import io
-import plotly.express as px
-from drive_utils import download_db_from_drive, upload_db_to_drive  # NOVO
+# pandas e plotly são importados nas funções que os usam: a tela de login abre sem eles
+from drive_utils import download_db_from_drive  # NOVO
+from answer_cache import cache_stats, list_entries, delete_entries, purge_expired, purge_all
+from session_tokens import list_sessions, revoke_sessions, purge_sessions
+from bulk_import import read_table, prepare_import, import_users
+from exports import FORMATS, export_bytes, file_name, mime_type
+from log_archive import archive_cutoff, retention_days, pending_months, archive_old_logs, archived_months, query_archives
+from database import (
+    connection, transaction, query, init_db, registrar_log, flush_logs, is_valid_email, user_exists,
+    get_action_codes, get_actions, get_validation_stats
+)
 
-DB_NAME = 'auth.db'
+LOG_PAGE_SIZES = [25, 50, 100, 200]
 
 # === BANCO DE DADOS ===
-def init_db():
-    download_db_from_drive()  # NOVO
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    # Tabela de usuários
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                    email TEXT PRIMARY KEY,
-                    senha TEXT,
-                    created_at TIMESTAMP,
-                    last_login TIMESTAMP
-                )''')
-    # Tabela de logs
-    c.execute('''CREATE TABLE IF NOT EXISTS logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    email TEXT,
-                    acao TEXT,
-                    timestamp TIMESTAMP
-                )''')
-    conn.commit()
-    conn.close()
-
-# === UTILITÁRIOS ===
-def registrar_log(email, acao):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO logs (email, acao, timestamp) VALUES (?, ?, ?)", (email, acao, datetime.now()))
-    conn.commit()
-    conn.close()
-    upload_db_to_drive()  # NOVO
-
-def is_valid_email(email):
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-def user_exists(email):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM users WHERE email=?", (email,))
-    exists = c.fetchone() is not None
-    conn.close()
-    return exists
-
 def register_user(email, senha):
     if not is_valid_email(email):
         return False, "E-mail inválido."
@@ -63,81 +30,109 @@ def register_user(email, senha):
 
     hashed = bcrypt.hashpw(senha.encode(), bcrypt.gensalt())
 
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    now = datetime.now()
-    c.execute("INSERT INTO users (email, senha, created_at, last_login) VALUES (?, ?, ?, ?)",
-              (email, hashed, now, now))
-    conn.commit()
-    conn.close()
-
-    registrar_log(email, "Cadastro")
-    upload_db_to_drive()  # NOVO
+    with transaction() as conn:
+        now = datetime.now()
+        conn.execute("INSERT INTO users (email, senha, created_at, last_login) VALUES (?, ?, ?, ?)",
+                     (email, hashed, now, now))
+        registrar_log(email, "Cadastro")
     return True, "✅ Usuário cadastrado com sucesso."
 
 def get_all_users():
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT email, created_at, last_login FROM users", conn)
-    conn.close()
-    return df
+    import pandas as pd
+    with connection() as conn:
+        return pd.read_sql_query("SELECT email, created_at, last_login FROM users", conn)
 
 def delete_user(email):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM users WHERE email=?", (email,))
-    conn.commit()
-    conn.close()
-    registrar_log(email, "Remoção")
-    upload_db_to_drive()  # NOVO
+    with transaction() as conn:
+        conn.execute("DELETE FROM users WHERE email=?", (email,))
+        revoke_sessions(email=email)
+        registrar_log(email, "Remoção")
 
 def get_all_emails():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT email FROM users")
-    emails = [row[0] for row in c.fetchall()]
-    conn.close()
-    return emails
+    return [row[0] for row in query("SELECT email FROM users")]
 
 def get_table_structure():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("PRAGMA table_info(users)")
-    columns = c.fetchall()
-    conn.close()
+    import pandas as pd
+    columns = query("PRAGMA table_info(users)")
     return pd.DataFrame(columns, columns=["cid", "name", "type", "notnull", "default_value", "pk"])
 
-def get_logs():
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM logs ORDER BY timestamp DESC", conn)
-    conn.close()
-    return df
+def get_logs_page(page_size, cursor=None, email=None, acao_code=None, start=None, end=None):
+    """Uma página do log, do mais recente para o mais antigo.
+
+    Paginação por chave: `cursor` é o (timestamp, id) da última linha da página
+    anterior, então o custo depende do tamanho da página e não da tabela.
+    Devolve (DataFrame, cursor da próxima página ou None).
+    """
+    where, params = [], []
+    if email:
+        # Prefixo de e-mail como faixa, para usar o índice (email, timestamp)
+        where.append("email >= ? AND email < ?")
+        params += [email, email + "\uffff"]
+    if acao_code is not None:
+        where.append("acao_code = ?")
+        params.append(acao_code)
+    if start:
+        where.append("timestamp >= ?")
+        params.append(start.isoformat())
+    if end:
+        where.append("timestamp < ?")
+        params.append((end + timedelta(days=1)).isoformat())
+    if cursor:
+        where.append("(timestamp, id) < (?, ?)")
+        params += list(cursor)
+    sql = "SELECT id, email, acao, timestamp FROM logs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(page_size + 1)
+
+    import pandas as pd
+    flush_logs()
+    with connection() as conn:
+        df = pd.read_sql_query(sql, conn, params=params)
+    if len(df) <= page_size:
+        return df, None
+    df = df.iloc[:page_size]
+    last = df.iloc[-1]
+    return df, (last['timestamp'], int(last['id']))
 
 def get_user_stats():
-    conn = sqlite3.connect(DB_NAME)
-    total_users = pd.read_sql_query("SELECT COUNT(*) as total FROM users", conn).iloc[0,0]
-    total_logins = pd.read_sql_query("SELECT COUNT(*) as total FROM logs WHERE acao LIKE '%Login%'", conn).iloc[0,0]
-    seven_days_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
-    logins_last_7_days = pd.read_sql_query(
-        f"SELECT COUNT(*) as total FROM logs WHERE acao LIKE '%Login%' AND timestamp >= '{seven_days_ago}'",
-        conn
-    ).iloc[0,0]
-    last_registered = pd.read_sql_query(
-        "SELECT email, created_at FROM users ORDER BY created_at DESC LIMIT 5",
-        conn
-    )
-    last_logins = pd.read_sql_query(
-        "SELECT email, last_login FROM users ORDER BY last_login DESC LIMIT 5",
-        conn
-    )
-    logins_by_day = pd.read_sql_query(
-        f"""SELECT date(timestamp) as dia, COUNT(*) as total 
-            FROM logs 
-            WHERE acao LIKE '%Login%' AND timestamp >= '{seven_days_ago}'
-            GROUP BY dia
-            ORDER BY dia""",
-        conn
-    )
-    conn.close()
+    import pandas as pd
+    flush_logs()
+    # Métricas vêm dos resumos mantidos por trigger (logs_por_dia, contadores),
+    # então o custo não depende do tamanho da tabela logs
+    login_codes = get_action_codes('Login')
+    in_codes = f"acao_code IN ({', '.join('?' for _ in login_codes)})" if login_codes else "0"
+    seven_days_ago = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+    with connection() as conn:
+        total_users = pd.read_sql_query(
+            "SELECT COALESCE(MAX(valor), 0) as total FROM contadores WHERE nome = 'users'", conn
+        ).iloc[0,0]
+        total_logins = pd.read_sql_query(
+            f"SELECT COALESCE(SUM(total), 0) as total FROM logs_por_dia WHERE {in_codes}",
+            conn, params=login_codes
+        ).iloc[0,0]
+        logins_last_7_days = pd.read_sql_query(
+            f"SELECT COALESCE(SUM(total), 0) as total FROM logs_por_dia WHERE {in_codes} AND dia >= ?",
+            conn, params=[*login_codes, seven_days_ago]
+        ).iloc[0,0]
+        last_registered = pd.read_sql_query(
+            "SELECT email, created_at FROM users ORDER BY created_at DESC LIMIT 5",
+            conn
+        )
+        last_logins = pd.read_sql_query(
+            "SELECT email, last_login FROM users ORDER BY last_login DESC LIMIT 5",
+            conn
+        )
+        logins_by_day = pd.read_sql_query(
+            f"""SELECT dia, SUM(total) as total 
+                FROM logs_por_dia 
+                WHERE {in_codes} AND dia >= ?
+                GROUP BY dia
+                HAVING SUM(total) > 0
+                ORDER BY dia""",
+            conn, params=[*login_codes, seven_days_ago]
+        )
     return {
         'total_users': total_users,
         'total_logins': total_logins,
@@ -173,7 +168,12 @@ def autenticar_admin():
 # === INTERFACE ===
 def main():
     st.set_page_config(page_title="Painel Administrativo - Coeso Cursos", layout="wide")
-    autenticar_admin()
+    try:
+        autenticar_admin()
+    finally:
+        # Sem login autenticar_admin() interrompe o script com st.stop()
+        timer.mark("login")
+        timer.report()
 
     st.sidebar.image("https://coesocursos.com.br/wp-content/uploads/2025/05/logo-e1738083192299.png", use_container_width=True)
     st.sidebar.title("Painel Administrativo")
@@ -183,7 +183,11 @@ def main():
         "📋 Visualizar Usuários",
         "🚔 Remover Usuário",
         "📊 Estrutura do Banco",
-        "🕵️ Log de Atividades"
+        "🕵️ Log de Atividades",
+        "🧠 Cache de Respostas",
+        "🔑 Sessões",
+        "📤 Exportar Dados",
+        "🗄️ Arquivo de Logs"
     ])
 
     if st.sidebar.button("🚪 Sair"):
@@ -211,6 +215,7 @@ def main():
         
         # Gráfico de logins por dia
         if not stats['logins_by_day'].empty:
+            import plotly.express as px
             st.subheader("Logins por Dia (últimos 7 dias)")
             fig = px.bar(
                 stats['logins_by_day'], 
@@ -233,6 +238,22 @@ def main():
         
         st.divider()
         
+        # Conferência local das fórmulas do item 3 (excel_formula.py)
+        validacoes = get_validation_stats(30)
+        conferidas = sum(n for resultado, n in validacoes.items() if resultado != 'nao_verificavel')
+        if conferidas:
+            st.subheader("Fórmulas Conferidas (últimos 30 dias)")
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Conferidas", conferidas)
+            with col2:
+                st.metric("Corretas de primeira", f"{validacoes.get('ok', 0) / conferidas:.0%}")
+            with col3:
+                st.metric("Corrigidas automaticamente", validacoes.get('corrigida', 0))
+            with col4:
+                st.metric("Com problema", validacoes.get('divergente', 0) + validacoes.get('erro', 0))
+            st.divider()
+        
         # Últimos cadastros e acessos
         col1, col2 = st.columns(2)
         with col1:
@@ -272,6 +293,39 @@ def main():
                 success, msg = register_user(email, senha)
                 st.success(msg) if success else st.error(msg)
 
+        st.divider()
+        st.subheader("Importar Turma (CSV ou XLSX)")
+        st.caption("A planilha deve ter as colunas **email** e **senha**.")
+        arquivo = st.file_uploader("Selecione a planilha:", type=["csv", "xlsx"])
+        if arquivo is not None:
+            try:
+                novos, rejeitados = prepare_import(read_table(arquivo))
+            except Exception as e:
+                st.error(f"Não foi possível ler a planilha: {e}")
+            else:
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.metric("Novos usuários", len(novos))
+                with col2:
+                    st.metric("Ignorados", len(rejeitados))
+                if not rejeitados.empty:
+                    with st.expander("Linhas ignoradas"):
+                        st.dataframe(rejeitados, use_container_width=True, hide_index=True)
+                if st.button("Importar", disabled=novos.empty):
+                    barra = st.progress(0.0, text="Gerando senhas...")
+                    try:
+                        total = import_users(
+                            novos,
+                            progress=lambda feitos, total: barra.progress(
+                                feitos / total, text=f"Gerando senhas... {feitos}/{total}"
+                            ),
+                        )
+                    except Exception as e:
+                        st.error(f"Erro na importação (nenhum usuário foi cadastrado): {e}")
+                    else:
+                        barra.progress(1.0, text="Concluído")
+                        st.success(f"✅ {total} usuário(s) cadastrado(s).")
+
     elif menu == "📋 Visualizar Usuários":
         st.subheader("Lista de Usuários Cadastrados")
         df = get_all_users()
@@ -279,12 +333,12 @@ def main():
             st.warning("Nenhum usuário cadastrado.")
         else:
             st.dataframe(df, use_container_width=True)
-            csv = df.to_csv(index=False).encode('utf-8')
+            # Gerado só no clique, em blocos (exports.py)
             st.download_button(
                 label="📂 Baixar CSV",
-                data=csv,
-                file_name="usuarios_coeso.csv",
-                mime="text/csv",
+                data=lambda: export_bytes("usuarios", "csv"),
+                file_name="usuarios_coeso.csv.gz",
+                mime=mime_type("csv"),
                 use_container_width=True
             )
 
@@ -307,13 +361,197 @@ def main():
 
     elif menu == "🕵️ Log de Atividades":
         st.subheader("Histórico de Ações no Sistema")
-        logs_df = get_logs()
+
+        acoes = dict((nome, code) for code, nome in get_actions())
+        col1, col2, col3, col4 = st.columns([3, 2, 3, 1])
+        with col1:
+            filtro_email = st.text_input("E-mail (início)", key="log_email").strip()
+        with col2:
+            filtro_acao = st.selectbox("Ação", ["Todas"] + list(acoes), key="log_acao")
+        with col3:
+            periodo = st.date_input("Período", value=(), key="log_periodo")
+        with col4:
+            page_size = st.selectbox("Por página", LOG_PAGE_SIZES, key="log_page_size")
+
+        inicio = periodo[0] if len(periodo) > 0 else None
+        fim = periodo[1] if len(periodo) > 1 else inicio
+        filtros = (filtro_email, filtro_acao, inicio, fim, page_size)
+        # Filtros novos voltam para a primeira página
+        if st.session_state.get('log_filtros') != filtros:
+            st.session_state.log_filtros = filtros
+            st.session_state.log_cursors = [None]
+
+        logs_df, next_cursor = get_logs_page(
+            page_size,
+            cursor=st.session_state.log_cursors[-1],
+            email=filtro_email or None,
+            acao_code=acoes.get(filtro_acao),
+            start=inicio,
+            end=fim,
+        )
         if logs_df.empty:
-            st.info("Nenhum log registrado até agora.")
+            st.info("Nenhum log encontrado.")
+        else:
+            st.dataframe(logs_df, use_container_width=True, hide_index=True)
+
+        pagina = len(st.session_state.log_cursors)
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("⬅️ Anterior", disabled=pagina == 1):
+                st.session_state.log_cursors.pop()
+                st.rerun()
+        with col2:
+            st.markdown(f"<div style='text-align: center;'>Página {pagina}</div>", unsafe_allow_html=True)
+        with col3:
+            if st.button("Próxima ➡️", disabled=next_cursor is None):
+                st.session_state.log_cursors.append(next_cursor)
+                st.rerun()
+
+    elif menu == "🧠 Cache de Respostas":
+        st.subheader("Cache de Respostas do Assistente")
+        stats = cache_stats()
+        consultas = stats['process_hits'] + stats['process_misses']
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Respostas em cache", stats['entries'])
+        with col2:
+            st.metric("Acertos (nesta réplica)", stats['total_hits'])
+        with col3:
+            taxa = f"{stats['process_hits'] / consultas:.0%}" if consultas else "—"
+            st.metric("Taxa de acerto (processo)", taxa)
+        with col4:
+            st.metric("Tamanho", f"{stats['size_bytes'] / 1024:.1f} KB")
+
+        import pandas as pd
+        entradas = pd.DataFrame(
+            list_entries(),
+            columns=["chave", "Pergunta", "Acertos", "Criada em", "Último uso"]
+        )
+        if entradas.empty:
+            st.info("O cache está vazio.")
+        else:
+            st.dataframe(entradas.drop(columns=["chave"]), use_container_width=True, hide_index=True)
+            selecionadas = st.multiselect(
+                "Remover perguntas específicas:",
+                entradas.index,
+                format_func=lambda i: entradas.at[i, "Pergunta"]
+            )
+            if st.button("Remover selecionadas", disabled=not selecionadas):
+                delete_entries(entradas.loc[selecionadas, "chave"].tolist())
+                st.rerun()
+
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("🧹 Remover expiradas"):
+                purge_expired()
+                st.rerun()
+        with col2:
+            if st.button("🗑️ Limpar todo o cache"):
+                purge_all()
+                st.success("Cache limpo.")
+
+    elif menu == "🔑 Sessões":
+        st.subheader("Sessões Ativas dos Alunos")
+        import pandas as pd
+        sessoes = pd.DataFrame(list_sessions(), columns=["token", "E-mail", "Criada em", "Expira em"])
+        st.metric("Sessões ativas", len(sessoes))
+        if sessoes.empty:
+            st.info("Nenhuma sessão ativa.")
+        else:
+            st.dataframe(sessoes.drop(columns=["token"]), use_container_width=True, hide_index=True)
+            selecionadas = st.multiselect(
+                "Revogar sessões específicas:",
+                sessoes.index,
+                format_func=lambda i: f"{sessoes.at[i, 'E-mail']} (desde {sessoes.at[i, 'Criada em']})"
+            )
+            if st.button("Revogar selecionadas", disabled=not selecionadas):
+                revoke_sessions(token_ids=sessoes.loc[selecionadas, "token"].tolist())
+                st.rerun()
+
+            email_sessoes = st.selectbox("Revogar todas as sessões do e-mail:",
+                                         sorted(sessoes["E-mail"].unique()))
+            if st.button("Revogar todas do e-mail"):
+                total = revoke_sessions(email=email_sessoes)
+                st.success(f"{total} sessão(ões) revogada(s) para {email_sessoes}.")
+
+        if st.button("🧹 Apagar expiradas"):
+            st.success(f"{purge_sessions()} sessão(ões) apagada(s).")
+
+    elif menu == "📤 Exportar Dados":
+        st.subheader("Exportar Dados")
+        tabelas = {
+            "Usuários (data de cadastro)": "usuarios",
+            "Log de atividades": "logs",
+            "Resumo diário de ações": "logs_por_dia",
+        }
+        tabela = tabelas[st.selectbox("Dados:", list(tabelas))]
+        formato = FORMATS[st.radio("Formato:", list(FORMATS), horizontal=True)]
+        col1, col2 = st.columns(2)
+        with col1:
+            inicio = st.date_input("De:", value=None, format="DD/MM/YYYY", key="exportar_inicio")
+        with col2:
+            fim = st.date_input("Até:", value=None, format="DD/MM/YYYY", key="exportar_fim")
+        if inicio and fim and inicio > fim:
+            st.error("A data inicial é posterior à final.")
+        else:
+            st.caption("Sem datas, exporta todo o período. O arquivo é gerado ao clicar.")
+            st.download_button(
+                label="📥 Exportar",
+                data=lambda: export_bytes(tabela, formato, inicio, fim),
+                file_name=file_name(tabela, formato, inicio, fim),
+                mime=mime_type(formato),
+                use_container_width=True
+            )
+
+    elif menu == "🗄️ Arquivo de Logs":
+        st.subheader("Arquivo de Logs")
+        corte = archive_cutoff()
+        st.caption(f"Retenção: {retention_days()} dias. Logs anteriores a {corte:%d/%m/%Y} vão para "
+                   "arquivos mensais no Google Drive e saem do banco (o dashboard não muda).")
+        pendentes = pending_months(corte)
+        if pendentes:
+            st.info(f"{sum(total for _, total, _ in pendentes)} logs de {len(pendentes)} mês(es) aguardam arquivamento.")
+            if st.button("🗄️ Arquivar agora"):
+                barra = st.progress(0.0, text="Arquivando...")
+                try:
+                    arquivados = archive_old_logs(
+                        progress=lambda feitos, total: barra.progress(feitos / total, text=f"Arquivando... {feitos}/{total}")
+                    )
+                except Exception as e:
+                    st.error(f"Erro ao arquivar: {e}")
+                else:
+                    st.success(f"✅ {sum(total for _, total in arquivados)} logs arquivados.")
         else:
-            st.dataframe(logs_df, use_container_width=True)
+            st.success("Nenhum log aguardando arquivamento.")
+
+        st.divider()
+        st.subheader("Consultar Logs Arquivados")
+        meses = archived_months()
+        if not meses:
+            st.info("Nenhum arquivo de logs no Drive.")
+        else:
+            selecionados = st.multiselect("Meses:", sorted(meses, reverse=True))
+            col1, col2 = st.columns(2)
+            with col1:
+                filtro_email = st.text_input("E-mail (início):", key="arquivo_email")
+            with col2:
+                filtro_acao = st.selectbox("Ação:", ["Todas"] + [nome for _, nome in get_actions()],
+                                           key="arquivo_acao")
+            if selecionados:
+                with st.spinner("Carregando arquivos..."):
+                    arquivo_df = query_archives(
+                        [file_id for mes in selecionados for file_id in meses[mes]],
+                        email=filtro_email or None,
+                        acao=None if filtro_acao == "Todas" else filtro_acao,
+                    )
+                st.caption(f"{len(arquivo_df)} registro(s)")
+                st.dataframe(arquivo_df, use_container_width=True, hide_index=True)
 
 # === EXECUÇÃO ===
 if __name__ == "__main__":
+    timer.mark("imports")
+    download_db_from_drive()  # NOVO
+    timer.mark("drive")
     init_db()
+    timer.mark("banco")
     main()
@@ -0,0 +1,141 @@
+# response_formatter.py - formatação das respostas do assistente nas 4 seções padrão
+
+import re
+
+SECTION_TITLES = {
+    1: "Explicação técnica breve",
+    2: "Fórmula matemática clara",
+    3: "Fórmula Excel aplicável",
+    4: "Exemplo numérico completo",
+}
+
+# Padrões compilados uma única vez
+BRACES = re.compile(r'\{.*?\}')
+LATEX_COMMAND = re.compile(r'\\[a-z]+')
+
+_TITLE_VARIANTS = {
+    1: r"explica[çc][ãa]o(?:\s+t[ée]cnica)?(?:\s+breve)?",
+    2: r"f[óo]rmula\s+matem[áa]tica(?:\s+clara)?",
+    3: r"f[óo]rmula\s+(?:(?:do|no|em)\s+)?excel(?:\s+aplic[áa]vel)?",
+    4: r"exemplo(?:\s+num[ée]rico)?(?:\s+completo)?",
+}
+_ANY_TITLE = "|".join(_TITLE_VARIANTS.values()) + r"|f[óo]rmula"
+_DECORATION = r"(?:#+\s*)?(?:\*\*\s*)?"
+
+# "1. Explicação técnica breve:", "**2) Fórmula**", "### 3. Fórmula Excel aplicável" ...
+SECTION_MARKER = re.compile(
+    rf"^\s*{_DECORATION}(?P<num>[1-4])\s*[.)]\s*(?:\*\*\s*)?"
+    rf"(?:(?:{_ANY_TITLE})\b\s*(?:\*\*)?\s*[:：]?\s*(?:\*\*)?\s*)?",
+    re.IGNORECASE,
+)
+# Linha só com o título, sem número ("**Fórmula Excel aplicável:**")
+TITLE_LINE = re.compile(
+    rf"^\s*{_DECORATION}(?:(?P<t1>{_TITLE_VARIANTS[1]})|(?P<t2>{_TITLE_VARIANTS[2]})"
+    rf"|(?P<t3>{_TITLE_VARIANTS[3]})|(?P<t4>{_TITLE_VARIANTS[4]}))"
+    rf"\s*(?:\*\*)?\s*[:：]?\s*(?:\*\*)?\s*$",
+    re.IGNORECASE,
+)
+
+
+def sanitize(text):
+    """Remove trechos {…} e comandos LaTeX (\\frac, \\text…) proibidos no prompt"""
+    return LATEX_COMMAND.sub('', BRACES.sub('', text))
+
+
+class ResponseFormatter:
+    """Formata a resposta em uma única passada, aceitando o texto em pedaços.
+
+    Cada linha completa é processada uma vez só; a linha ainda incompleta fica
+    em espera e aparece apenas na prévia de render(). As seções só avançam
+    (1 → 4), então listas numeradas dentro de uma seção continuam como texto.
+    Sem nenhuma seção reconhecida, o texto limpo é devolvido como veio.
+    """
+
+    def __init__(self):
+        self._pending = ""      # linha ainda incompleta
+        self._parts = []        # markdown já formatado das seções
+        self._plain = []        # linhas antes da primeira seção
+        self._section = 0
+        self._has_content = False
+        self._blank_lines = 0
+
+    def feed(self, chunk):
+        """Acrescenta um pedaço do texto (custo proporcional ao tamanho do pedaço)"""
+        if '\n' not in chunk:
+            self._pending += chunk
+            return
+        head, tail = chunk.rsplit('\n', 1)
+        lines = (self._pending + head).split('\n')
+        self._pending = tail
+        for line in lines:
+            self._add_line(line)
+
+    def finish(self):
+        """Processa o restante e devolve o texto final"""
+        if self._pending:
+            self._add_line(self._pending)
+            self._pending = ""
+        return self.text()
+
+    def text(self):
+        if self._parts:
+            if len(self._parts) > 1:
+                # Junta o que acumulou desde a última chamada (mantém o custo linear)
+                self._parts[:] = ["".join(self._parts)]
+            return self._parts[0].strip()
+        return "\n".join(self._plain).strip()
+
+    def render(self):
+        """Texto formatado até agora, incluindo a linha incompleta"""
+        partial = sanitize(self._pending)
+        if not self._parts:
+            return "\n".join(self._plain + [partial]).strip()
+        if not partial.strip():
+            return self.text()
+        separator = "\n" * (self._blank_lines + 1) if self._has_content else "\n\n"
+        return self.text() + separator + partial.strip()
+
+    def _add_line(self, line):
+        line = sanitize(line)
+        number, rest = self._match_section(line)
+        if number:
+            self._start_section(number)
+            line = rest
+        if not self._parts:
+            self._plain.append(line)
+            return
+        if not line.strip():
+            if self._has_content:
+                self._blank_lines += 1
+            return
+        if self._has_content:
+            self._parts.append("\n" * (self._blank_lines + 1) + line)
+        else:
+            self._parts.append("\n\n" + line.lstrip())
+            self._has_content = True
+        self._blank_lines = 0
+
+    def _match_section(self, line):
+        match = SECTION_MARKER.match(line)
+        if match and int(match.group('num')) > self._section:
+            return int(match.group('num')), line[match.end():]
+        match = TITLE_LINE.match(line)
+        if match:
+            number = int(match.lastgroup[1])
+            if number > self._section:
+                return number, ""
+        return 0, line
+
+    def _start_section(self, number):
+        prefix = "\n\n" if self._parts else ""
+        self._parts.append(f"{prefix}**{number}. {SECTION_TITLES[number]}**")
+        self._section = number
+        self._has_content = False
+        self._blank_lines = 0
+
+
+def format_response(text):
+    """Formata uma resposta completa"""
+    formatter = ResponseFormatter()
+    formatter.feed(text)
+    return formatter.finish()
@@ -0,0 +1,138 @@
+# session_tokens.py - sessões assinadas e com validade, retomadas sem bcrypt
+#
+# No login o aluno recebe um token "<id>.<assinatura>" guardado na URL
+# (?sessao=...). Ao recarregar a página ou reconectar, o token é conferido com
+# uma busca pela chave primária de `sessions` e um HMAC, no lugar de
+# bcrypt.checkpw + update_last_login + registrar_log.
+#
+# A chave das assinaturas tem que ser a mesma em todas as réplicas e sobreviver
+# a reinícios, por isso vem do secrets.toml:
+#     [session]
+#     secret = "<64 caracteres hex, ex.: python -c 'import secrets; print(secrets.token_hex(32))'>"
+# Sem ela o login com senha continua funcionando; só não há tokens para retomar.
+
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+
+import streamlit as st
+
+from database import query, query_one, transaction
+
+SESSION_PARAM = "sessao"             # parâmetro da URL com o token
+SESSION_COOKIE = "coeso_sessao"      # também aceito, se um proxy o definir
+SESSION_TTL_SECONDS = 12 * 3600      # pode ser sobrescrito: [session] ttl_hours = 24
+
+logger = logging.getLogger(__name__)
+_secret = None   # b"" = não configurada (aviso já registrado)
+
+
+def _get_secret():
+    """[session] secret do secrets.toml, ou None (sessões desativadas)"""
+    global _secret
+    if _secret is None:
+        try:
+            value = st.secrets["session"]["secret"]
+        except Exception:
+            value = None
+        if not value:
+            logger.warning("Sem [session] secret no secrets.toml: login só com senha, "
+                           "sem retomar sessões")
+        _secret = value.encode("utf-8") if value else b""
+    return _secret or None
+
+
+def _ttl_seconds():
+    try:
+        return float(st.secrets["session"]["ttl_hours"]) * 3600
+    except Exception:
+        return SESSION_TTL_SECONDS
+
+
+def _signature(token_id, email, expires_at):
+    message = f"{token_id}|{email}|{expires_at!r}".encode("utf-8")
+    return hmac.new(_get_secret(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def create_session(email):
+    """Abre uma sessão para o e-mail (já autenticado) e devolve o token (None sem a chave)"""
+    if _get_secret() is None:
+        return None
+    token_id = secrets.token_urlsafe(16)
+    now = time.time()
+    expires_at = now + _ttl_seconds()
+    token = f"{token_id}.{_signature(token_id, email, expires_at)}"
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO sessions (token_id, email, created_at, expires_at) VALUES (?, ?, ?, ?)",
+            (token_id, email, now, expires_at),
+        )
+    return token
+
+
+def resume_session(token):
+    """E-mail dono do token, se ele for autêntico, não revogado e não expirado; senão None"""
+    if not token or "." not in token or _get_secret() is None:
+        return None
+    token_id, signature = token.rsplit(".", 1)
+    # Busca pela chave primária; o JOIN descarta sessões de usuários removidos
+    row = query_one(
+        """SELECT s.email, s.expires_at FROM sessions s JOIN users u ON u.email = s.email
+           WHERE s.token_id = ? AND s.revoked = 0""",
+        (token_id,),
+    )
+    if row is None or row[1] < time.time():
+        return None
+    if not hmac.compare_digest(signature, _signature(token_id, row[0], row[1])):
+        return None
+    return row[0]
+
+
+def token_from_request():
+    """Token enviado pela URL (?sessao=) ou pelo cookie, se houver"""
+    token = st.query_params.get(SESSION_PARAM)
+    if token:
+        return token
+    try:
+        return st.context.cookies.get(SESSION_COOKIE)
+    except Exception:
+        return None
+
+
+def revoke_session(token):
+    if token and "." in token:
+        revoke_sessions(token_ids=[token.rsplit(".", 1)[0]])
+
+
+def revoke_sessions(token_ids=None, email=None):
+    """Revoga as sessões indicadas (por id ou todas de um e-mail); devolve quantas"""
+    with transaction() as conn:
+        if email is not None:
+            cur = conn.execute("UPDATE sessions SET revoked = 1 WHERE email = ? AND revoked = 0", (email,))
+        else:
+            cur = conn.executemany("UPDATE sessions SET revoked = 1 WHERE token_id = ? AND revoked = 0",
+                                   [(token_id,) for token_id in token_ids or []])
+        return cur.rowcount
+
+
+# === ADMINISTRAÇÃO ===
+def list_sessions():
+    """Sessões ativas: (token_id, email, criada em, expira em)"""
+    return query(
+        """SELECT token_id, email, datetime(created_at, 'unixepoch', 'localtime'),
+                  datetime(expires_at, 'unixepoch', 'localtime')
+           FROM sessions WHERE revoked = 0 AND expires_at >= ? ORDER BY created_at DESC""",
+        (time.time(),),
+    )
+
+
+def purge_sessions():
+    """Apaga sessões expiradas; devolve quantas
+
+    Revogadas ficam até expirar: sem a linha com revoked = 1, a cópia de outra
+    réplica (base ou segmento) voltaria com revoked = 0 e o token valeria de novo.
+    """
+    with transaction() as conn:
+        return conn.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),)).rowcount
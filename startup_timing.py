@@ -0,0 +1,40 @@
+# startup_timing.py - tempo de cada fase da primeira execução de um script
+#
+# Uso (no topo do script, antes dos outros imports):
+#     timer = StartupTimer("main.py")
+#     ... imports ...
+#     timer.mark("imports")
+#     ...
+#     timer.report()   # escreve no log uma vez por processo
+#
+# O relatório sai no logger do Streamlit (config.toml: [logger] level = "info").
+
+import time
+
+from streamlit.logger import get_logger
+
+logger = get_logger(__name__)
+
+_reported = set()  # scripts que já registraram o relatório neste processo
+
+
+class StartupTimer:
+    def __init__(self, script):
+        self.script = script
+        self.start = self.last = time.perf_counter()
+        self.phases = []
+
+    def mark(self, phase):
+        """Fecha a fase `phase` (tempo desde a marca anterior)"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        """Registra as fases só na primeira execução do script (reruns não entram)"""
+        if self.script in _reported:
+            return
+        _reported.add(self.script)
+        total = time.perf_counter() - self.start
+        phases = " | ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases)
+        logger.info("Inicialização de %s: %s | total %.0f ms", self.script, phases, total * 1000)
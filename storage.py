@@ -0,0 +1,229 @@
+# storage.py - onde o drive_utils guarda o auth.db, os segmentos e os arquivos de logs
+#
+# O drive_utils só usa as operações de StorageBackend (metadados, listagem,
+# download, upload, criação e exclusão de arquivos por nome). Backends:
+#
+#   drive  -> Google Drive, pasta banco-coeso (padrão; ver drive_utils.DriveBackend)
+#   local  -> diretório local, sem rede; com atraso e falhas injetados serve
+#             para medir estratégias de sync de forma reproduzível
+#
+# Seleção no .streamlit/secrets.toml (o config.toml é do próprio Streamlit):
+#     [storage]
+#     backend = "local"
+#     dir = "/tmp/banco-coeso"
+#     latency_ms = 80          # atraso fixo por requisição
+#     jitter_ms = 40           # + atraso aleatório entre 0 e jitter_ms
+#     throughput_mbps = 20     # tempo de transferência proporcional ao tamanho (0 = sem limite)
+#     failure_rate = 0.05      # fração das requisições que falham (erro transitório)
+#     seed = 42                # sorteios reproduzíveis
+#
+# Vários processos apontando para o mesmo diretório se comportam como
+# réplicas compartilhando a pasta do Drive.
+
+import hashlib
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import streamlit as st
+
+LOCAL_RETRIES = 5             # como o num_retries das chamadas ao Drive
+LOCAL_RETRY_BACKOFF_MS = 50   # dobra a cada nova tentativa
+
+
+def storage_config():
+    """Seção [storage] do secrets.toml ({} = Google Drive)"""
+    try:
+        return dict(st.secrets["storage"])
+    except Exception:
+        return {}
+
+
+class InjectedFailure(ConnectionError):
+    """Falha sorteada pelo backend local (tratada como erro de rede transitório)"""
+
+
+class StorageBackend(ABC):
+    """Operações que o drive_utils usa. Metadados são dicts com as chaves do
+    Drive: id, name, md5Checksum, modifiedTime, version e headRevisionId.
+    `source` é o caminho de um arquivo ou os próprios bytes.
+    """
+
+    @abstractmethod
+    def find(self, name):
+        """Metadados do arquivo `name`, ou None"""
+
+    @abstractmethod
+    def list(self, prefix):
+        """(nome, id) dos arquivos cujo nome começa com `prefix`"""
+
+    @abstractmethod
+    def download(self, file_id, fh):
+        """Grava o conteúdo do arquivo em `fh` (arquivo binário aberto)"""
+
+    @abstractmethod
+    def put(self, name, source):
+        """Substitui (ou cria) o arquivo `name`; devolve os metadados novos"""
+
+    @abstractmethod
+    def create(self, name, source):
+        """Cria sempre um arquivo novo; devolve seus metadados"""
+
+    @abstractmethod
+    def delete(self, file_id):
+        """Remove o arquivo (já removido não é erro)"""
+
+
+class LocalBackend(StorageBackend):
+    def __init__(self, root, latency_ms=0, jitter_ms=0, throughput_mbps=0, failure_rate=0.0, seed=None):
+        self.root = root
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.bytes_per_second = throughput_mbps * 125_000
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        # Contadores para comparar estratégias de sync
+        self.stats = {"requests": 0, "failures": 0, "bytes_sent": 0, "bytes_received": 0, "seconds": 0.0}
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get("dir", "banco-coeso-local"),
+            latency_ms=float(config.get("latency_ms", 0)),
+            jitter_ms=float(config.get("jitter_ms", 0)),
+            throughput_mbps=float(config.get("throughput_mbps", 0)),
+            failure_rate=float(config.get("failure_rate", 0)),
+            seed=config.get("seed"),
+        )
+
+    # === ATRASO E FALHAS INJETADOS ===
+    def _request(self, size=0):
+        """Simula uma requisição: atraso, falhas sorteadas e novas tentativas"""
+        start = time.perf_counter()
+        try:
+            for attempt in range(LOCAL_RETRIES + 1):
+                with self._random_lock:
+                    delay = self.latency + self._random.random() * self.jitter
+                    failed = self._random.random() < self.failure_rate
+                if self.bytes_per_second:
+                    delay += size / self.bytes_per_second
+                time.sleep(delay)
+                self.stats["requests"] += 1
+                if not failed:
+                    return
+                self.stats["failures"] += 1
+                if attempt < LOCAL_RETRIES:
+                    time.sleep(LOCAL_RETRY_BACKOFF_MS / 1000 * 2 ** attempt)
+            raise InjectedFailure(f"Falha injetada após {LOCAL_RETRIES + 1} tentativas")
+        finally:
+            self.stats["seconds"] += time.perf_counter() - start
+
+    # === METADADOS (files.json, com trava entre processos) ===
+    @contextmanager
+    def _files(self):
+        import fcntl  # só existe em Unix; o backend do Drive não precisa dele
+        with open(os.path.join(self.root, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            path = os.path.join(self.root, "files.json")
+            try:
+                with open(path) as f:
+                    files = json.load(f)
+            except (OSError, ValueError):
+                files = {}
+            before = json.dumps(files, sort_keys=True)
+            yield files
+            # Leituras (find, list, download) não regravam o arquivo
+            if json.dumps(files, sort_keys=True) == before:
+                return
+            tmp = path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(files, f)
+            os.replace(tmp, path)
+
+    def _blob(self, file_id):
+        return os.path.join(self.root, "blobs", file_id)
+
+    def _write(self, meta, source):
+        """Grava o conteúdo e atualiza os metadados como o Drive faria a cada revisão"""
+        tmp = self._blob(meta["id"]) + ".tmp"
+        if isinstance(source, (bytes, bytearray)):
+            with open(tmp, "wb") as f:
+                f.write(source)
+        else:
+            shutil.copyfile(source, tmp)
+        digest = hashlib.md5()
+        with open(tmp, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        os.replace(tmp, self._blob(meta["id"]))
+        meta.update(
+            md5Checksum=digest.hexdigest(),
+            size=str(os.path.getsize(self._blob(meta["id"]))),
+            headRevisionId=uuid.uuid4().hex,
+            version=str(int(meta.get("version", "0")) + 1),
+            modifiedTime=datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        )
+        return dict(meta)
+
+    @staticmethod
+    def _size(source):
+        return len(source) if isinstance(source, (bytes, bytearray)) else os.path.getsize(source)
+
+    # === OPERAÇÕES ===
+    def find(self, name):
+        self._request()
+        with self._files() as files:
+            for meta in files.values():
+                if meta["name"] == name:
+                    return dict(meta)
+        return None
+
+    def list(self, prefix):
+        self._request()
+        with self._files() as files:
+            return [(meta["name"], meta["id"]) for meta in files.values() if meta["name"].startswith(prefix)]
+
+    def download(self, file_id, fh):
+        with self._files() as files:
+            if file_id not in files:
+                raise FileNotFoundError(f"Arquivo não encontrado: {file_id}")
+            size = int(files[file_id]["size"])
+            # O arquivo aberto continua legível mesmo se for substituído ou apagado
+            src = open(self._blob(file_id), "rb")
+        with src:
+            self._request(size)
+            shutil.copyfileobj(src, fh)
+        self.stats["bytes_received"] += size
+
+    def put(self, name, source):
+        self._request(self._size(source))
+        self.stats["bytes_sent"] += self._size(source)
+        with self._files() as files:
+            meta = next((m for m in files.values() if m["name"] == name), None)
+            if meta is None:
+                file_id = uuid.uuid4().hex
+                meta = files[file_id] = {"id": file_id, "name": name}
+            return self._write(meta, source)
+
+    def create(self, name, source):
+        self._request(self._size(source))
+        self.stats["bytes_sent"] += self._size(source)
+        with self._files() as files:
+            file_id = uuid.uuid4().hex
+            files[file_id] = {"id": file_id, "name": name}
+            return self._write(files[file_id], source)
+
+    def delete(self, file_id):
+        self._request()
+        with self._files() as files:
+            if files.pop(file_id, None) is not None:
+                os.remove(self._blob(file_id))
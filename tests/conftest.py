@@ -0,0 +1,68 @@
+# Os módulos do app ficam na raiz do repositório (sem pacote)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contextlib import contextmanager  # noqa: E402
+
+import pytest  # noqa: E402
+
+import database  # noqa: E402
+import drive_utils  # noqa: E402
+from storage import LocalBackend  # noqa: E402
+
+
+# === RÉPLICAS ===
+# Cada réplica é um diretório com o seu auth.db; todas compartilham o mesmo
+# LocalBackend, como processos diferentes compartilhando a pasta do Drive.
+
+# Estado de drive_utils que pertence a cada processo
+PROCESS_STATE = ('_remote_meta', '_last_checked', '_segments_since_base', '_replica_id', '_base_outdated')
+
+
+class Replica:
+    def __init__(self, root, name):
+        self.dir = root / name
+        self.dir.mkdir()
+        self.state = {'_remote_meta': None, '_last_checked': None, '_segments_since_base': None,
+                      '_replica_id': name, '_base_outdated': False}
+
+    @contextmanager
+    def active(self):
+        cwd = os.getcwd()
+        os.chdir(self.dir)
+        for name, value in self.state.items():
+            setattr(drive_utils, name, value)
+        try:
+            yield
+        finally:
+            database.flush_logs()
+            database.close_all()
+            self.state = {name: getattr(drive_utils, name) for name in PROCESS_STATE}
+            os.chdir(cwd)
+
+    def start(self):
+        """Como no início do main.py: baixa do Drive e migra"""
+        with self.active():
+            drive_utils._last_checked = None
+            drive_utils.download_db_from_drive()
+            database.init_db()
+
+    def sync(self):
+        with self.active():
+            drive_utils._sync_changes()
+
+    def query(self, sql, params=()):
+        with self.active():
+            return database.query(sql, params)
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    """replica('a') cria uma réplica nova apontando para o mesmo armazenamento"""
+    monkeypatch.setattr(drive_utils, '_backend', LocalBackend(str(tmp_path / 'drive')))
+    # Sem thread de sync em segundo plano: os testes chamam Replica.sync()
+    monkeypatch.setattr(database, 'schedule_db_upload', lambda: None)
+    monkeypatch.setattr(drive_utils, 'schedule_db_upload', lambda: None)
+    return lambda name: Replica(tmp_path, name)
@@ -0,0 +1,25 @@
+# Cadastro em lote (bulk_import): linhas rejeitadas antes do bcrypt
+
+import pandas as pd
+
+import database
+from bulk_import import import_users, prepare_import
+
+
+def test_long_passwords_are_rejected_before_hashing(replica):
+    a = replica('a')
+    a.start()
+    df = pd.DataFrame({
+        "email": ["curta@x.com", "longa@x.com", "acentos@x.com"],
+        # 72 bytes passam; 73 ou mais (contando bytes UTF-8, não caracteres) não
+        "senha": ["s" * 72, "s" * 73, "ç" * 37],
+    })
+    with a.active():
+        novos, rejeitados = prepare_import(df)
+        assert novos["email"].tolist() == ["curta@x.com"]
+        assert rejeitados.set_index("email")["motivo"].to_dict() == {
+            "longa@x.com": "Senha com mais de 72 bytes",
+            "acentos@x.com": "Senha com mais de 72 bytes",
+        }
+        assert import_users(novos) == 1
+        assert database.user_exists("curta@x.com")
@@ -0,0 +1,73 @@
+# Avaliação local das fórmulas e conferência item 3 × item 4 (excel_formula)
+
+import pytest
+
+from excel_formula import check_answer, evaluate
+
+EXEMPLOS = [
+    ("=PI()*(B2/2)^2*C2", {"B2": 0.3, "C2": 3}, 0.2120575),
+    ("=SE(B2>10;B2*2;B2/2)", {"B2": 12}, 24),
+    ("=ARREDONDAR.PARA.CIMA(B2*C2^2/D2^2;0)", {"B2": 5, "C2": 10, "D2": 8}, 8),
+    ("=PROCV(2;A1:B3;2;FALSO)", {"A1": 1, "B1": 10, "A2": 2, "B2": 20, "A3": 3, "B3": 30}, 20),
+    ("=ÍNDICE(A1:B3;3;2)", {"A1": 1, "B1": 10, "A2": 2, "B2": 20, "A3": 3, "B3": 30}, 30),
+    ("=-2^2+0,5*2", {}, 5),
+    # O Excel aceita minúsculas em funções, células e intervalos
+    ("=pi()*(b2/2)^2*c2", {"B2": 0.3, "C2": 3}, 0.2120575),
+    ("=se(b2>10;soma(a1:a3);falso)", {"A1": 1, "A2": 2, "A3": 3, "B2": 12}, 6),
+    ("=índice($a$1:b3;3;2)", {"A1": 1, "B1": 10, "A2": 2, "B2": 20, "A3": 3, "B3": 30}, 30),
+]
+
+RESPOSTA = ("**3. Fórmula Excel aplicável**\n\n```=PI()*(B2/2)^2*C2```\n\n"
+            "**4. Exemplo numérico completo**\n\nPara diâmetro 0,30 m e altura 3 m: "
+            "Volume = π × (0,30/2)² × 3 ≈ 0,212 m³")
+
+
+@pytest.mark.parametrize("formula, cells, expected", EXEMPLOS)
+def test_evaluate(formula, cells, expected):
+    assert evaluate(formula, cells) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("old, new, status", [
+    ("=PI()", "=PI()", "ok"),
+    ("=PI()*(B2/2)^2*C2", "=pi()*(b2/2)^2*c2", "ok"),
+    ("(B2/2)^2", "B2^2", "divergente"),
+    ("PI()", "PI(", "erro"),
+    ("=PI()*", "=ROUND(PI();2)*", "erro"),
+])
+def test_check_answer(old, new, status):
+    assert check_answer(RESPOSTA.replace(old, new)).status == status
+
+
+# Exemplo do próprio prompt: o total (2,12) não é dado de entrada
+PILARES = ("**3. Fórmula Excel aplicável**\n\n```=PI()*(B2/2)^2*C2```\n\n"
+           "**4. Exemplo numérico completo**\n\n"
+           "Para 10 pilares com diâmetro de 0,30m e altura de 3m:\n"
+           "Volume de 1 pilar = π × (0,30/2)^2 × 3 ≈ 0,212 m³\n"
+           "Volume total = 0,212 × 10 ≈ 2,12 m³")
+
+
+@pytest.mark.parametrize("formula, status", [
+    ("=PI()*(B2/2)^2*C2", "ok"),
+    ("=B2*C2", "divergente"),
+    ("=B2", "divergente"),
+    ("=B2/C2", "divergente"),
+    ("=B2*C2*D2", "divergente"),
+])
+def test_results_are_not_inputs(formula, status):
+    assert check_answer(PILARES.replace("=PI()*(B2/2)^2*C2", formula, 1)).status == status
+
+
+def test_divergence_reports_the_example_inputs():
+    check = check_answer(PILARES.replace("(B2/2)^2", "B2^2", 1))
+    assert check.detail == "avaliada com B2=0,3 e C2=3 dá 0,84823, valor que não aparece no item 4"
+
+
+def test_unlabeled_inputs_follow_their_order():
+    resposta = ("**3. Fórmula**\n\n```=B2*C2```\n\n"
+                "**4. Exemplo**\n\nLaje de 5 m por 4 m: Área = 5 × 4 = 20 m²")
+    assert check_answer(resposta).status == "ok"
+    assert check_answer(resposta.replace("=B2*C2", "=B2/C2")).status == "divergente"
+
+
+def test_strings_keep_their_case():
+    assert evaluate('="Laje "&b2', {"B2": "a"}) == "Laje a"
@@ -0,0 +1,32 @@
+# Respostas calculadas localmente (local_answers)
+
+import pytest
+
+from local_answers import local_answer
+
+EXEMPLOS = [
+    ("Volume de 10 pilares com diâmetro de 0,30 m e altura de 3 m", "2,121 m³"),
+    ("Volume de concreto de uma laje 5m x 4m com espessura de 12 cm", "2,400 m³"),
+    ("laje de 6 por 3 metros com 12 cm de espessura", "2,160 m³"),
+    ("traço 1:2:3 para 2 m³ de concreto", "743,9 kg"),
+    ("5 barras de 10mm equivalem a quantas de 8mm?", "8 barras de 8,0 mm"),
+    ("quantas barras de 10mm preciso para substituir 6 barras de 16mm", "16 barras de 10,0 mm"),
+    ("trocar 4 barras de 8mm por barras de 10mm", "3 barras de 10,0 mm"),
+    ("quantas barras de 8 mm substituem barras de 10 mm?", "2 barras de 8,0 mm"),
+    # Sem nenhum número valem os exemplos do SYSTEM_PROMPT
+    ("Como calcular o volume de pilares?", "2,121 m³"),
+    ("Como calcular a área de uma laje?", "20,00 m²"),
+    ("Como usar PROCV em orçamentos?", None),
+    # Números que o template não sabe ler: a pergunta vai para a OpenAI
+    ("volume de pilar circular de 3 metros", None),
+    ("laje de 6 x 3 m com 10 cm", None),
+]
+
+
+@pytest.mark.parametrize("pergunta, esperado", EXEMPLOS)
+def test_local_answer(pergunta, esperado):
+    resposta = local_answer(pergunta)
+    if esperado is None:
+        assert resposta is None
+    else:
+        assert esperado in resposta
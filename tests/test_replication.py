@@ -0,0 +1,172 @@
+# Replicação do auth.db entre réplicas (drive_utils) sobre o backend local
+
+import gzip
+import json
+import sqlite3
+
+import database
+import drive_utils
+
+
+def test_answer_cache_survives_restart(replica):
+    from answer_cache import get_cached_answer, store_answer
+
+    a = replica('a')
+    a.start()
+    a.sync()
+    with a.active():
+        store_answer("Como calcular área de laje 5 x 4?", "resposta")
+    a.sync()
+
+    b = replica('b')
+    b.start()
+    with b.active():
+        assert get_cached_answer("Como calcular área de laje 5 x 4?") == "resposta"
+    # O acerto só conta na réplica: nada a enviar ao Drive
+    assert b.query("SELECT hits FROM answer_cache") == [(1,)]
+    assert b.query("SELECT COUNT(*) FROM _changes") == [(0,)]
+
+
+def test_answer_cache_purge_sticks(replica):
+    from answer_cache import get_cached_answer, purge_all, store_answer
+
+    pergunta = "Como calcular área de laje 5 x 4?"
+    a = replica('a')
+    a.start()
+    a.sync()
+    with a.active():
+        store_answer(pergunta, "resposta errada")
+    a.sync()
+
+    b = replica('b')
+    b.start()
+    with a.active():
+        purge_all()
+    a.sync()
+
+    # B ainda tem a linha: nem um acerto nem a base enviada por B a trazem de volta
+    with b.active():
+        assert get_cached_answer(pergunta) == "resposta errada"
+    b.sync()
+    b.state['_base_outdated'] = True
+    b.sync()
+    # A, com escritas ainda não enviadas, mescla a base de B em vez de substituí-la
+    with a.active():
+        database.registrar_uso_tokens('aluno@x.com', 100, 90, 40)
+    for r in (a, b, replica('c')):
+        r.start()
+        with r.active():
+            assert get_cached_answer(pergunta) is None
+
+
+def test_token_usage_rows_replicate(replica):
+    a = replica('a')
+    a.start()
+    a.sync()
+    for estimado in (100, 200):
+        with a.active():
+            database.registrar_uso_tokens('aluno@x.com', estimado, 90, 40)
+        a.sync()
+
+    b = replica('b')
+    b.start()
+    assert b.query("SELECT prompt_estimado FROM uso_tokens ORDER BY 1") == [(100,), (200,)]
+
+
+def test_formula_checks_replicate(replica):
+    a = replica('a')
+    a.start()
+    a.sync()
+    for resultado in ('ok', 'divergente'):
+        with a.active():
+            database.registrar_validacao(resultado, '=B2*C2')
+        a.sync()
+
+    b = replica('b')
+    b.start()
+    with b.active():
+        assert database.get_validation_stats() == {'ok': 1, 'divergente': 1}
+
+
+def _baseline_db(path, version=9):
+    """auth.db como estava antes das migrações de replicação entre réplicas"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    for target, statements in enumerate(database.MIGRATIONS[:version], start=1):
+        for sql in statements:
+            conn.execute(sql)
+        conn.execute(f"PRAGMA user_version = {target}")
+    conn.execute("INSERT INTO users (email, senha, created_at) VALUES ('antigo@x.com', 'hash', '2024-01-01')")
+    conn.close()
+
+
+def _migrated_segment(replica):
+    """Segmento de uma réplica já migrada: usuário novo (com updated_at) e uma sessão"""
+    replica.start()
+    with replica.active():
+        with database.transaction() as conn:
+            conn.execute("INSERT INTO users (email, senha, created_at) VALUES ('novo@x.com', 'hash', '2025-01-01')")
+            conn.execute("INSERT INTO sessions (token_id, email, created_at, expires_at) VALUES ('t1', 'novo@x.com', 0, 1)")
+        conn = sqlite3.connect(drive_utils.DB_FILENAME)
+        try:
+            return drive_utils._build_segment(conn)[1]
+        finally:
+            conn.close()
+
+
+def test_migrated_segment_on_baseline_schema_is_deferred(replica, tmp_path):
+    data = _migrated_segment(replica('c'))
+    path = str(tmp_path / 'baseline.db')
+    _baseline_db(path, version=7)
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            # Sem users.updated_at nem sessions: nada é mesclado e o segmento fica pendente
+            assert drive_utils._apply_segment(conn, data) is False
+        assert conn.execute("SELECT email FROM users").fetchall() == [('antigo@x.com',)]
+    finally:
+        conn.close()
+
+
+def test_row_with_unknown_columns_waits_for_migration(tmp_path):
+    path = str(tmp_path / 'atual.db')
+    _baseline_db(path, version=len(database.MIGRATIONS))
+    row = {'email': 'novo@x.com', 'senha': 'hash', 'created_at': '2025-01-01',
+           'updated_at': '2025-01-01 00:00:00.000', 'apelido': 'Novo'}  # coluna de uma migração futura
+    data = gzip.compress(json.dumps({'t': 'users', 'k': 'novo@x.com', 'r': row}).encode('utf-8'))
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            assert drive_utils._apply_segment(conn, data) is False
+        assert conn.execute("SELECT email FROM users").fetchall() == [('antigo@x.com',)]
+    finally:
+        conn.close()
+
+
+def test_cold_start_from_baseline_base_replays_migrated_segments(replica, tmp_path):
+    path = str(tmp_path / 'baseline.db')
+    _baseline_db(path)
+    with open(path, 'rb') as f:
+        drive_utils._backend.put(drive_utils.DB_FILENAME, gzip.compress(f.read()))
+
+    # Réplica já migrada que envia um segmento antes de substituir a base antiga
+    c = replica('c')
+    c.start()
+    c.state['_base_outdated'] = False
+    with c.active():
+        with database.transaction() as conn:
+            conn.execute("INSERT INTO users (email, senha, created_at) VALUES ('novo@x.com', 'hash', '2025-01-01')")
+    c.sync()
+    assert [name for name, _ in drive_utils._backend.list(drive_utils.SEGMENT_PREFIX)]
+
+    d = replica('d')
+    with d.active():
+        assert drive_utils.download_db_from_drive()
+        assert drive_utils._base_outdated
+    assert d.query("SELECT email FROM users ORDER BY 1") == [('antigo@x.com',), ('novo@x.com',)]
+
+    # A base migrada vai para o Drive: o próximo processo não migra de novo
+    d.sync()
+    e = replica('e')
+    with e.active():
+        assert drive_utils.download_db_from_drive()
+        assert not drive_utils._base_outdated
@@ -0,0 +1,63 @@
+# Saídas de referência e custo linear do response_formatter
+#
+#     python -m pytest tests/test_response_formatter.py
+
+import timeit
+
+import pytest
+
+from response_formatter import ResponseFormatter, format_response
+
+GOLDEN = [
+    (
+        "1. Explicação técnica breve: A área é comprimento vezes largura.\n"
+        "2. Fórmula matemática clara: Área = comprimento × largura\n"
+        "3. Fórmula Excel aplicável: ```=B2*C2```\n"
+        "4. Exemplo numérico completo: Para 5 m por 4 m: Área = 5 × 4 = 20 m²",
+        "**1. Explicação técnica breve**\n\nA área é comprimento vezes largura.\n\n"
+        "**2. Fórmula matemática clara**\n\nÁrea = comprimento × largura\n\n"
+        "**3. Fórmula Excel aplicável**\n\n```=B2*C2```\n\n"
+        "**4. Exemplo numérico completo**\n\nPara 5 m por 4 m: Área = 5 × 4 = 20 m²",
+    ),
+    (
+        "Claro!\n\n**1. Explicação técnica breve:**\nVolume do pilar.\n\n"
+        "**Fórmula matemática clara**\nV = π × r² × h\n"
+        "3) Fórmula do Excel: ```=PI()*(B2/2)^2*C2```\n"
+        "### 4. Exemplo\n1. Raio = 0,15 m\n2. V ≈ 0,212 m³",
+        "**1. Explicação técnica breve**\n\nVolume do pilar.\n\n"
+        "**2. Fórmula matemática clara**\n\nV = π × r² × h\n\n"
+        "**3. Fórmula Excel aplicável**\n\n```=PI()*(B2/2)^2*C2```\n\n"
+        "**4. Exemplo numérico completo**\n\n1. Raio = 0,15 m\n2. V ≈ 0,212 m³",
+    ),
+    (
+        "Use \\text{Área} = b \\times h para calcular.",
+        "Use  = b  h para calcular.",
+    ),
+]
+
+
+@pytest.mark.parametrize("raw, expected", GOLDEN)
+def test_golden_output(raw, expected):
+    assert format_response(raw) == expected
+
+
+@pytest.mark.parametrize("raw, expected", GOLDEN)
+def test_streaming_matches_full_text(raw, expected):
+    # Em pedaços pequenos (como no streaming) o resultado tem que ser o mesmo
+    formatter = ResponseFormatter()
+    for i in range(0, len(raw), 3):
+        formatter.feed(raw[i:i + 3])
+    assert formatter.finish() == expected
+
+
+def test_cost_is_linear():
+    """Micro-benchmark: o custo por KB não cresce com o tamanho da resposta"""
+    base = GOLDEN[1][0] + "\n"
+    per_kb = []
+    for repeat in (10, 100):
+        text = base + "Detalhe da conta com {x} e \\frac removidos.\n" * (20 * repeat)
+        runs = 500 // repeat
+        seconds = min(timeit.repeat(lambda: format_response(text), number=runs, repeat=3)) / runs
+        per_kb.append(seconds / (len(text) / 1024))
+    # Folga larga para máquinas de CI ruidosas; um custo quadrático daria ~10x
+    assert per_kb[1] < 3 * per_kb[0]
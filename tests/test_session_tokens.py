@@ -0,0 +1,69 @@
+# Sessões assinadas (session_tokens) retomadas em outra réplica
+
+from types import SimpleNamespace
+
+import pytest
+
+import database
+import session_tokens
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setattr(session_tokens, "st", SimpleNamespace(secrets={"session": {"secret": "k" * 64}}))
+    monkeypatch.setattr(session_tokens, "_secret", None)
+
+
+def test_session_resumes_on_another_replica(replica, secret):
+    a = replica('a')
+    a.start()
+    with a.active():
+        with database.transaction() as conn:
+            conn.execute("INSERT INTO users (email, senha) VALUES ('aluno@x.com', 'hash')")
+        token = session_tokens.create_session('aluno@x.com')
+    a.sync()
+
+    b = replica('b')
+    b.start()
+    with b.active():
+        assert session_tokens.resume_session(token) == 'aluno@x.com'
+        assert session_tokens.resume_session(token.split(".")[0] + "." + "0" * 32) is None
+
+
+def test_missing_secret_disables_sessions_only(replica, monkeypatch):
+    # Sem a chave o login com senha segue normal: só não há token
+    monkeypatch.setattr(session_tokens, "st", SimpleNamespace(secrets={}))
+    monkeypatch.setattr(session_tokens, "_secret", None)
+    a = replica('a')
+    a.start()
+    with a.active():
+        assert session_tokens.create_session('aluno@x.com') is None
+        assert session_tokens.resume_session("abc." + "0" * 32) is None
+    assert a.query("SELECT COUNT(*) FROM sessions") == [(0,)]
+
+
+def test_revoked_session_stays_revoked_after_purge(replica, secret):
+    a = replica('a')
+    a.start()
+    with a.active():
+        with database.transaction() as conn:
+            conn.execute("INSERT INTO users (email, senha) VALUES ('aluno@x.com', 'hash')")
+        token = session_tokens.create_session('aluno@x.com')
+    a.sync()
+
+    # B envia uma base com a sessão ativa depois que A revogou e limpou
+    b = replica('b')
+    b.start()
+    with a.active():
+        session_tokens.revoke_session(token)
+        assert session_tokens.purge_sessions() == 0
+    b.state['_base_outdated'] = True
+    b.sync()
+    # A ainda não enviou a revogação: mescla a base de B e depois envia
+    a.start()
+    a.sync()
+
+    for r in (a, replica('c')):
+        r.start()
+        with r.active():
+            assert session_tokens.resume_session(token) is None
@@ -0,0 +1,34 @@
+# Backend local de armazenamento (storage.py)
+
+import os
+
+import pytest
+
+from storage import LocalBackend, StorageBackend
+
+
+def test_backend_must_implement_every_operation():
+    class Incompleto(StorageBackend):
+        def find(self, name):
+            return None
+
+    with pytest.raises(TypeError):
+        Incompleto()
+
+
+def test_reads_do_not_rewrite_metadata(tmp_path):
+    backend = LocalBackend(str(tmp_path))
+    meta = backend.put("auth.db", b"conteudo")
+    path = tmp_path / "files.json"
+    os.utime(path, ns=(0, 0))
+
+    assert backend.find("auth.db")["id"] == meta["id"]
+    assert backend.list("auth") == [("auth.db", meta["id"])]
+    with open(tmp_path / "baixado", "wb") as fh:
+        backend.download(meta["id"], fh)
+    assert path.stat().st_mtime_ns == 0
+
+    backend.delete(meta["id"])
+    assert path.stat().st_mtime_ns != 0
+    assert backend.find("auth.db") is None
+
@@ -0,0 +1,30 @@
+# Sync em segundo plano (drive_utils): novas tentativas com backoff
+
+import threading
+import time
+
+import drive_utils
+
+
+def test_failed_sync_backs_off(monkeypatch):
+    monkeypatch.setattr(drive_utils, 'SYNC_DEBOUNCE_SECONDS', 0.01)
+    monkeypatch.setattr(drive_utils, 'SYNC_RETRY_SECONDS', 0.05)
+    monkeypatch.setattr(drive_utils, 'SYNC_RETRY_MAX_SECONDS', 0.1)
+    calls = []
+    done = threading.Event()
+
+    def sync_changes():
+        calls.append(time.monotonic())
+        if len(calls) <= 4:
+            raise RuntimeError("auth.db no Drive mudou 3 vezes durante o upload")
+        done.set()
+
+    monkeypatch.setattr(drive_utils, '_sync_changes', sync_changes)
+    drive_utils.schedule_db_upload()
+    assert done.wait(5)
+
+    # 0,05 s, 0,1 s e depois o teto de 0,1 s entre as tentativas
+    gaps = [b - a for a, b in zip(calls, calls[1:])]
+    assert [gap >= expected for gap, expected in zip(gaps, (0.05, 0.1, 0.1, 0.1))] == [True] * 4
+    assert max(gaps) < 1
+    assert not drive_utils._has_pending_upload()
@@ -0,0 +1,73 @@
+# token_budget.py - histórico da conversa limitado por orçamento de tokens
+
+import math
+import re
+
+CONTEXT_WINDOW_TOKENS = 16385   # janela do gpt-3.5-turbo
+PROMPT_TOKEN_BUDGET = 3000      # teto para system + histórico + pergunta atual
+MESSAGE_OVERHEAD_TOKENS = 4     # papel e separadores de cada mensagem
+REPLY_PRIMING_TOKENS = 3
+SUMMARY_ITEM_CHARS = 100        # cada pergunta antiga entra no resumo com até isso
+SUMMARY_MAX_ITEMS = 5           # ... e só as mais recentes entre as descartadas
+
+WORD_OR_SYMBOL = re.compile(r'\w+|[^\w\s]')
+
+
+def estimate_tokens(text):
+    """Estimativa local (sem rede) de tokens no estilo BPE.
+
+    Palavras contam ~1 token a cada 4 caracteres e cada símbolo conta 1.
+    Erra para mais em português, o que é o lado seguro para um orçamento.
+    """
+    total = 0
+    for piece in WORD_OR_SYMBOL.findall(text):
+        total += math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == '_' else 1
+    return total
+
+
+def message_tokens(message):
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _summary_message(dropped):
+    questions = [m["content"].strip().replace("\n", " ") for m in dropped if m["role"] == "user"]
+    if not questions:
+        return None
+    items = [q if len(q) <= SUMMARY_ITEM_CHARS else q[:SUMMARY_ITEM_CHARS - 1] + "…"
+             for q in questions[-SUMMARY_MAX_ITEMS:]]
+    return {
+        "role": "system",
+        "content": "Perguntas anteriores do aluno nesta conversa: " + "; ".join(items),
+    }
+
+
+def trim_history(messages, max_tokens, budget=PROMPT_TOKEN_BUDGET):
+    """Seleciona o histórico a enviar sem passar do orçamento de tokens.
+
+    Sempre mantém o SYSTEM_PROMPT (messages[0]) e a última mensagem; das mais
+    novas para as mais antigas, inclui turnos enquanto couberem em
+    min(budget, janela - max_tokens). As perguntas descartadas viram uma linha
+    de resumo, se couber. Devolve (mensagens, tokens estimados, descartadas).
+    """
+    limit = min(budget, CONTEXT_WINDOW_TOKENS - max_tokens)
+    system, rest = messages[0], messages[1:]
+    used = message_tokens(system) + REPLY_PRIMING_TOKENS
+
+    kept = []
+    for message in reversed(rest):
+        cost = message_tokens(message)
+        if kept and used + cost > limit:
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+    # Não começa o histórico por uma resposta sem a pergunta correspondente
+    while len(kept) > 1 and kept[0]["role"] == "assistant":
+        used -= message_tokens(kept.pop(0))
+
+    dropped = rest[:len(rest) - len(kept)]
+    summary = _summary_message(dropped)
+    if summary is not None and used + message_tokens(summary) <= limit:
+        used += message_tokens(summary)
+        return [system, summary] + kept, used, len(dropped)
+    return [system] + kept, used, len(dropped)